@@ -1,6 +1,21 @@
-import streamlit as st
+import os
+import time
+
+import altair as alt
 import numpy as np
-import pickle
+import pandas as pd
+import streamlit as st
+
+import batch_predict
+import metrics
+import model_registry
+import scoring
+import sweep
+from async_queue import QUEUE, Overloaded
+from audit_log import AUDIT
+from drift import MONITOR
+from features import ENCODER
+from prediction_cache import CACHE
 
 st.set_page_config(
     page_title="Chronic Kidney Disease Prediction",
@@ -20,10 +35,220 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-def load_model():
-    with open('model/random_forest_model1.pkl', 'rb') as file:
-        model = pickle.load(file)
-    return model
+# CKD_ENGINE=flat serves predictions from the compiled FlatForest instead of sklearn
+USE_FLAT_ENGINE = os.environ.get('CKD_ENGINE', 'sklearn') == 'flat'
+# How long a form submission may wait in the scoring queue before we ask the user to retry
+PREDICTION_DEADLINE = 5.0
+
+# Short column names as shown on the form, for the prediction explanation
+FEATURE_LABELS = {
+    'age': 'Age', 'bp': 'Blood Pressure', 'sg': 'Specific Gravity', 'al': 'Albumin', 'su': 'Sugar',
+    'rbc': 'Red Blood Cells', 'pc': 'Pus Cell', 'pcc': 'Pus Cell Clumps', 'ba': 'Bacteria',
+    'bgr': 'Blood Glucose Random', 'bu': 'Blood Urea', 'sc': 'Serum Creatinine', 'sod': 'Sodium',
+    'pot': 'Potassium', 'hemo': 'Hemoglobin', 'pcv': 'Packed Cell Volume', 'wbcc': 'White Blood Cell Count',
+    'rbcc': 'Red Blood Cell Count', 'htn': 'Hypertension', 'dm': 'Diabetes Mellitus',
+    'cad': 'Coronary Artery Disease', 'appet': 'Appetite', 'pe': 'Pedal Edema', 'ane': 'Anemia',
+}
+
+def load_model(name):
+    return model_registry.get_model(name, compiled=USE_FLAT_ENGINE)
+
+def choose_models():
+    names = model_registry.list_models()
+    default = names.index(model_registry.DEFAULT_MODEL) if model_registry.DEFAULT_MODEL in names else 0
+    model_name = st.sidebar.selectbox('Model', names, index=default, help='Model used for predictions')
+    shadow_name = st.sidebar.selectbox(
+        'Shadow model', ['None'] + [name for name in names if name != model_name],
+        help='Also scored for comparison; does not change the prediction shown'
+    )
+    return model_name, None if shadow_name == 'None' else shadow_name
+
+def show_cache_stats():
+    stats = model_registry.cache_stats()
+    with st.sidebar.expander('⚙️ Model cache'):
+        st.write(f"Loads: {stats['loads']} ({stats['load_seconds'] * 1000:.1f} ms total)")
+        st.write(f"Cache hits: {stats['hits']}")
+        st.write(f"Invalidations: {stats['invalidations']}")
+        predictions = CACHE.stats()
+        st.write(f"Cached predictions: {predictions['size']} "
+                 f"({predictions['hits']} hits, {predictions['misses']} misses)")
+        queue = QUEUE.stats()
+        st.write(f"Scoring queue: {queue['depth']} waiting (max {queue['max_depth']}), "
+                 f"{queue['rejected_full'] + queue['rejected_deadline'] + queue['expired']} turned away")
+        audit = AUDIT.stats()
+        if AUDIT.enabled:
+            st.write(f"Audit log: {audit['written']} written, {audit['pending']} pending"
+                     + (f", {audit['dropped']} dropped" if audit['dropped'] else '')
+                     + (f" ({audit['error']})" if audit['error'] else ''))
+
+def show_contributions(baseline, contributions, top=5):
+    st.caption(f"Average patient: {baseline:.1%}. Largest effects on this patient's risk:")
+    for i in np.argsort(-np.abs(contributions))[:top]:
+        st.caption(f"{FEATURE_LABELS[ENCODER.names[i]]}: {contributions[i]:+.1%}")
+
+def show_drift():
+    summary = MONITOR.summary()
+    with st.sidebar.expander('📉 Input drift'):
+        if summary.get('error'):
+            st.write(summary['error'])
+            return
+        st.write(f"Predictions checked: {summary['rows']}")
+        drifted = [FEATURE_LABELS[name] for name, feature in summary['features'].items() if feature['drifted']]
+        st.write(f"Drifting from the training data: {', '.join(drifted) or 'none'}")
+        outside = {FEATURE_LABELS[name]: feature['out_of_range']
+                   for name, feature in summary['features'].items() if feature['out_of_range']}
+        if outside:
+            st.write('Out-of-range values: ' + ', '.join(f'{name} ({count})' for name, count in outside.items()))
+
+def decision_threshold():
+    return st.sidebar.slider(
+        'Decision threshold', min_value=0.05, max_value=0.95, value=scoring.DEFAULT_THRESHOLD, step=0.05,
+        help='Patients with a risk probability above this are flagged as high risk. '
+             'Lower it to catch more cases at the cost of more false alarms.'
+    )
+
+def show_batch_scoring(model, model_name, threshold, shadow=None):
+    st.markdown("""
+    Upload a CSV with the same columns as `data/df.csv` to score every patient at once.
+    """)
+    uploaded = st.file_uploader('Patients CSV', type='csv')
+    if uploaded is None:
+        return
+
+    try:
+        df = pd.read_csv(uploaded)
+        started = time.perf_counter()
+        with metrics.span('batch_score', batch=metrics.batch_label(len(df))):
+            X = ENCODER.encode_batch(df)
+            result = batch_predict.score_frame(model, df, threshold, shadow, X=X)
+        # the tab rescores the upload on every rerun; log each file once per model and threshold
+        audited = (uploaded.file_id, model_name, threshold)
+        if st.session_state.get('audited_batch') != audited:
+            AUDIT.record(model_name, X, result['ckd_probability'].to_numpy(), result['prediction'].to_numpy(),
+                         threshold, (time.perf_counter() - started) * 1000)
+            st.session_state['audited_batch'] = audited
+    except ValueError as e:
+        st.error(f"Error scoring file: {str(e)}")
+        return
+
+    col1, col2 = st.columns(2)
+    col1.metric(label="Patients", value=len(result))
+    col2.metric(label="High Risk", value=int(result['prediction'].sum()))
+    if shadow is not None:
+        agreement = (result['prediction'] == result['shadow_prediction']).mean()
+        st.caption(f"Shadow model agrees on {agreement:.1%} of patients")
+    st.dataframe(result, use_container_width=True)
+    st.download_button(
+        'Download results CSV',
+        data=result.to_csv(index=False),
+        file_name='ckd_predictions.csv',
+        mime='text/csv',
+        use_container_width=True,
+    )
+
+def show_what_if(model, record, threshold):
+    st.markdown("""
+    See how the risk changes when one or two inputs vary, with everything else as entered in the form.
+    The whole grid is scored in a single pass.
+    """)
+    names = st.multiselect('Inputs to vary', sweep.SWEEPABLE, default=['sc'], max_selections=2,
+                           format_func=lambda name: FEATURE_LABELS[name])
+    if not names:
+        return
+    points = st.slider('Points per input', min_value=5, max_value=100, value=50 if len(names) == 1 else 30)
+    axes = {}
+    for name in names:
+        low, high = sweep.data_range(name)
+        start, stop = st.slider(f"{FEATURE_LABELS[name]} range", min_value=low, max_value=high,
+                                value=(low, high), step=(high - low) / 100)
+        axes[name] = sweep.grid_values(name, start, stop, points)
+
+    try:
+        with metrics.span('sweep', batch=metrics.batch_label(int(np.prod([len(v) for v in axes.values()])))):
+            result = sweep.sweep(model, record, axes)
+    except ValueError as e:
+        st.error(f"Error running sweep: {str(e)}")
+        return
+
+    risk_scale = alt.Scale(domain=[0, 1])
+    if len(names) == 1:
+        name = names[0]
+        curve = alt.Chart(result).mark_line().encode(
+            x=alt.X(name, title=FEATURE_LABELS[name]),
+            y=alt.Y('ckd_probability', title='Risk probability', scale=risk_scale, axis=alt.Axis(format='%')),
+        )
+        cutoff = alt.Chart(pd.DataFrame({'threshold': [threshold]})).mark_rule(strokeDash=[4, 4]).encode(
+            y='threshold')
+        current = alt.Chart(pd.DataFrame({name: [float(record[name])]})).mark_rule(color='gray').encode(x=name)
+        chart = curve + cutoff + current
+    else:
+        x, y = names
+        chart = alt.Chart(result).mark_rect().encode(
+            x=alt.X(f'{x}:O', title=FEATURE_LABELS[x], axis=alt.Axis(format='.4~g', labelOverlap=True)),
+            y=alt.Y(f'{y}:O', title=FEATURE_LABELS[y], sort='descending',
+                    axis=alt.Axis(format='.4~g', labelOverlap=True)),
+            color=alt.Color('ckd_probability', title='Risk', scale=alt.Scale(domain=[0, 1], scheme='redyellowgreen',
+                                                                           reverse=True), legend=alt.Legend(format='%')),
+            tooltip=[x, y, alt.Tooltip('ckd_probability', format='.1%')],
+        )
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(f"{len(result)} points scored in one batch")
+
+def predict(record, model_name, shadow_name, threshold):
+    """Encode and score the submitted patient; returns everything show_result draws."""
+    started = time.perf_counter()
+    with metrics.span('encode', model=model_name, batch='1'):
+        input_data = ENCODER.encode_one(record)
+    out_of_range = MONITOR.observe(input_data)[0]
+
+    # One walk through the trees gives the risk, the label and how each input moved the risk;
+    # the cache keeps all three, so resubmitting a patient skips the trees entirely. It runs in
+    # the shared queue, so a rush of submissions waits its turn (or is turned away) instead of
+    # all hitting the model at once.
+    with metrics.span('predict', model=model_name, batch='1'):
+        prediction, risk, baseline, contributions = QUEUE.run(
+            CACHE.explain, model_name, input_data, threshold, USE_FLAT_ENGINE, timeout=PREDICTION_DEADLINE)
+    result = {'record': record, 'model': model_name, 'shadow': shadow_name, 'threshold': threshold,
+              'prediction': int(prediction[0]), 'risk': float(risk[0]), 'out_of_range': out_of_range}
+    if shadow_name is not None:
+        shadow_prediction, shadow_risk = QUEUE.run(CACHE.score, shadow_name, input_data,
+                                                   threshold, USE_FLAT_ENGINE,
+                                                   timeout=PREDICTION_DEADLINE)
+        result['shadow_prediction'], result['shadow_risk'] = int(shadow_prediction[0]), float(shadow_risk[0])
+    AUDIT.record(model_name, input_data, risk, prediction, threshold,
+                 (time.perf_counter() - started) * 1000)
+    result['baseline'], result['contributions'] = float(baseline[0]), contributions[0]
+    return result
+
+def show_result(result, model_name, shadow_name, threshold):
+    st.markdown("---")
+    st.subheader("🔍 Prediction Result")
+    if (result['model'], result['shadow'], result['threshold']) != (model_name, shadow_name, threshold):
+        st.caption(f"Scored with {result['model']} at threshold {result['threshold']:.2f}. "
+                   "Press Predict to score with the current settings.")
+
+    result_col1, result_col2 = st.columns([2, 1])
+    with result_col1:
+        if result['prediction'] == 1:
+            st.error('⚠️ High Risk: The patient is likely to have Chronic Kidney Disease')
+        else:
+            st.success('✅ Low Risk: The patient is likely to be healthy')
+
+    with result_col2:
+        st.metric(
+            label="Risk Probability",
+            value=f"{result['risk']:.1%}"
+        )
+        show_contributions(result['baseline'], result['contributions'])
+        if result['shadow'] is not None:
+            verdict = 'agrees' if result['shadow_prediction'] == result['prediction'] else 'disagrees'
+            st.caption(f"Shadow {result['shadow']}: {result['shadow_risk']:.1%} ({verdict})")
+
+    if result['out_of_range']:
+        details = ', '.join(f"{FEATURE_LABELS[name]} {result['record'][name]} (training data "
+                            f"{MONITOR.describe(name)})" for name in result['out_of_range'])
+        st.warning(f"Outside the range the model was trained on: {details}. "
+                   "Treat this prediction with extra caution.")
 
 def main():
     st.title('🏥 Chronic Kidney Disease Prediction')
@@ -33,127 +258,106 @@ def main():
     """)
     
     try:
-        model = load_model()
-        tab1, tab2, tab3 = st.tabs(["📊 Basic Information", "🔬 Laboratory Results", "📋 Medical History"])
-
-        with tab1:
-            col1, col2 = st.columns(2)
-            with col1:
-                age = st.number_input('Age (years)', min_value=1, max_value=100, value=40, help='Enter age in years')
-                bp = st.number_input('Blood Pressure (mm/Hg)', min_value=50, max_value=180, value=80, help='Enter blood pressure in mm/Hg')
+        if metrics.ENABLED:
+            metrics.start_log_reporter()
+        # once per process, before the first prediction needs it
+        MONITOR.load()
+        model_name, shadow_name = choose_models()
+        with metrics.span('load_model', model=model_name):
+            model = load_model(model_name)
+        shadow = load_model(shadow_name) if shadow_name else None
+        show_cache_stats()
+        show_drift()
+        threshold = decision_threshold()
+        patient_tab, batch_tab, what_if_tab = st.tabs(["🩺 Patient", "📁 Batch Scoring", "📈 What-if"])
+
+        with batch_tab:
+            show_batch_scoring(model, model_name, threshold, shadow)
+
+        with patient_tab:
+            # a form, so changing an input does not rerun the app; only Predict does
+            with st.form('patient'):
+                tab1, tab2, tab3 = st.tabs(["📊 Basic Information", "🔬 Laboratory Results", "📋 Medical History"])
+
+                with tab1:
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        age = st.number_input('Age (years)', min_value=1, max_value=100, value=40, help='Enter age in years')
+                        bp = st.number_input('Blood Pressure (mm/Hg)', min_value=50, max_value=180, value=80, help='Enter blood pressure in mm/Hg')
             
-            with col2:
-                appet = st.radio('Appetite', ['good', 'poor'], help='Select appetite condition')
-                pe = st.radio('Pedal Edema', ['yes', 'no'], help='Select if pedal edema is present')
-                ane = st.radio('Anemia', ['yes', 'no'], help='Select if anemia is present')
+                    with col2:
+                        appet = st.radio('Appetite', ['good', 'poor'], help='Select appetite condition')
+                        pe = st.radio('Pedal Edema', ['yes', 'no'], help='Select if pedal edema is present')
+                        ane = st.radio('Anemia', ['yes', 'no'], help='Select if anemia is present')
         
-        with tab2:
-            col1, col2 = st.columns(2)
-            with col1:
-                sg = st.selectbox('Specific Gravity', [1.005, 1.010, 1.015, 1.020, 1.025], 
-                                help='Select specific gravity value')
-                al = st.selectbox('Albumin', [0, 1, 2, 3, 4, 5], help='Select albumin level')
-                su = st.selectbox('Sugar', [0, 1, 2, 3, 4, 5], help='Select sugar level')
-                bgr = st.number_input('Blood Glucose Random (mgs/dl)', min_value=0, max_value=500, value=100,
-                                    help='Enter blood glucose random in mgs/dl')
-                bu = st.number_input('Blood Urea (mgs/dl)', min_value=0, max_value=200, value=40,
-                                   help='Enter blood urea in mgs/dl')
-                sc = st.number_input('Serum Creatinine (mgs/dl)', min_value=0.0, max_value=15.0, value=1.0,
-                                   help='Enter serum creatinine in mgs/dl')
+                with tab2:
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        sg = st.selectbox('Specific Gravity', [1.005, 1.010, 1.015, 1.020, 1.025], 
+                                        help='Select specific gravity value')
+                        al = st.selectbox('Albumin', [0, 1, 2, 3, 4, 5], help='Select albumin level')
+                        su = st.selectbox('Sugar', [0, 1, 2, 3, 4, 5], help='Select sugar level')
+                        bgr = st.number_input('Blood Glucose Random (mgs/dl)', min_value=0, max_value=500, value=100,
+                                            help='Enter blood glucose random in mgs/dl')
+                        bu = st.number_input('Blood Urea (mgs/dl)', min_value=0, max_value=200, value=40,
+                                           help='Enter blood urea in mgs/dl')
+                        sc = st.number_input('Serum Creatinine (mgs/dl)', min_value=0.0, max_value=15.0, value=1.0,
+                                           help='Enter serum creatinine in mgs/dl')
             
-            with col2:
-                sod = st.number_input('Sodium (mEq/L)', min_value=0, max_value=200, value=135,
-                                    help='Enter sodium level in mEq/L')
-                pot = st.number_input('Potassium (mEq/L)', min_value=0.0, max_value=10.0, value=4.0,
-                                    help='Enter potassium level in mEq/L')
-                hemo = st.number_input('Hemoglobin (gms)', min_value=0.0, max_value=20.0, value=12.0,
-                                     help='Enter hemoglobin in gms')
-                pcv = st.number_input('Packed Cell Volume (%)', min_value=0, max_value=60, value=40,
-                                    help='Enter packed cell volume percentage')
-                wbcc = st.number_input('White Blood Cell Count (cells/cumm)', min_value=0, max_value=50000, value=8000,
-                                     help='Enter white blood cell count in cells/cumm')
-                rbcc = st.number_input('Red Blood Cell Count (millions/cmm)', min_value=0.0, max_value=8.0, value=4.5,
-                                     help='Enter red blood cell count in millions/cmm')
+                    with col2:
+                        sod = st.number_input('Sodium (mEq/L)', min_value=0, max_value=200, value=135,
+                                            help='Enter sodium level in mEq/L')
+                        pot = st.number_input('Potassium (mEq/L)', min_value=0.0, max_value=10.0, value=4.0,
+                                            help='Enter potassium level in mEq/L')
+                        hemo = st.number_input('Hemoglobin (gms)', min_value=0.0, max_value=20.0, value=12.0,
+                                             help='Enter hemoglobin in gms')
+                        pcv = st.number_input('Packed Cell Volume (%)', min_value=0, max_value=60, value=40,
+                                            help='Enter packed cell volume percentage')
+                        wbcc = st.number_input('White Blood Cell Count (cells/cumm)', min_value=0, max_value=50000, value=8000,
+                                             help='Enter white blood cell count in cells/cumm')
+                        rbcc = st.number_input('Red Blood Cell Count (millions/cmm)', min_value=0.0, max_value=8.0, value=4.5,
+                                             help='Enter red blood cell count in millions/cmm')
         
-        with tab3:
-            col1, col2 = st.columns(2)
-            with col1:
-                rbc = st.radio('Red Blood Cells', ['normal', 'abnormal'], help='Select red blood cells condition')
-                pc = st.radio('Pus Cell', ['normal', 'abnormal'], help='Select pus cell condition')
-                pcc = st.radio('Pus Cell Clumps', ['present', 'notpresent'], help='Select if pus cell clumps are present')
-                ba = st.radio('Bacteria', ['present', 'notpresent'], help='Select if bacteria are present')
+                with tab3:
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        rbc = st.radio('Red Blood Cells', ['normal', 'abnormal'], help='Select red blood cells condition')
+                        pc = st.radio('Pus Cell', ['normal', 'abnormal'], help='Select pus cell condition')
+                        pcc = st.radio('Pus Cell Clumps', ['present', 'notpresent'], help='Select if pus cell clumps are present')
+                        ba = st.radio('Bacteria', ['present', 'notpresent'], help='Select if bacteria are present')
             
-            with col2:
-                htn = st.radio('Hypertension', ['yes', 'no'], help='Select if patient has hypertension')
-                dm = st.radio('Diabetes Mellitus', ['yes', 'no'], help='Select if patient has diabetes mellitus')
-                cad = st.radio('Coronary Artery Disease', ['yes', 'no'], help='Select if patient has coronary artery disease')
+                    with col2:
+                        htn = st.radio('Hypertension', ['yes', 'no'], help='Select if patient has hypertension')
+                        dm = st.radio('Diabetes Mellitus', ['yes', 'no'], help='Select if patient has diabetes mellitus')
+                        cad = st.radio('Coronary Artery Disease', ['yes', 'no'], help='Select if patient has coronary artery disease')
 
-            st.markdown("---")
-            col1, col2, col3 = st.columns([1, 2, 1])
-            with col2:
-                predict_button = st.button('Predict', use_container_width=True)
+                st.markdown("---")
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col2:
+                    predict_button = st.form_submit_button('Predict', use_container_width=True)
 
-            if predict_button:
-                rbc_num = 1 if rbc == 'abnormal' else 0
-                pc_num = 1 if pc == 'abnormal' else 0
-                pcc_num = 1 if pcc == 'present' else 0
-                ba_num = 1 if ba == 'present' else 0
-                htn_num = 1 if htn == 'yes' else 0
-                dm_num = 1 if dm == 'yes' else 0
-                cad_num = 1 if cad == 'yes' else 0
-                appet_num = 1 if appet == 'poor' else 0
-                pe_num = 1 if pe == 'yes' else 0
-                ane_num = 1 if ane == 'yes' else 0
-
-                input_data = np.array([[
-                    int(age),              # age - Int64
-                    int(bp),               # bp - Int64
-                    int(sg * 1000),        # sg - int64 (converting from float to int by multiplying by 1000)
-                    int(al),               # al - int64
-                    int(su),               # su - int64
-                    int(rbc_num),          # rbc - int64
-                    int(pc_num),           # pc - int64
-                    int(pcc_num),          # pcc - int64
-                    int(ba_num),           # ba - int64
-                    int(bgr),              # bgr - Int64
-                    int(bu),               # bu - Int64
-                    float(sc),             # sc - float64
-                    int(sod),              # sod - Int64
-                    float(pot),            # pot - float64
-                    float(hemo),           # hemo - float64
-                    int(pcv),              # pcv - Int64
-                    float(wbcc),           # wbcc - float64
-                    float(rbcc),           # rbcc - float64
-                    int(htn_num),          # htn - int64
-                    int(dm_num),           # dm - int64
-                    int(cad_num),          # cad - int64
-                    int(appet_num),        # appet - int64
-                    int(pe_num),           # pe - int64
-                    int(ane_num),          # ane - int64
-                ]])
+            record = {
+                'age': age, 'bp': bp, 'sg': sg, 'al': al, 'su': su, 'rbc': rbc,
+                'pc': pc, 'pcc': pcc, 'ba': ba, 'bgr': bgr, 'bu': bu, 'sc': sc,
+                'sod': sod, 'pot': pot, 'hemo': hemo, 'pcv': pcv, 'wbcc': wbcc, 'rbcc': rbcc,
+                'htn': htn, 'dm': dm, 'cad': cad, 'appet': appet, 'pe': pe, 'ane': ane,
+            }
 
+            if predict_button:
                 try:
-                    prediction = model.predict(input_data)
-                    prediction_proba = model.predict_proba(input_data)
-
-                    st.markdown("---")
-                    st.subheader("🔍 Prediction Result")
-                    
-                    result_col1, result_col2 = st.columns([2, 1])
-                    with result_col1:
-                        if prediction[0] == 1:
-                            st.error('⚠️ High Risk: The patient is likely to have Chronic Kidney Disease')
-                        else:
-                            st.success('✅ Low Risk: The patient is likely to be healthy')
-                    
-                    with result_col2:
-                        st.metric(
-                            label="Risk Probability",
-                            value=f"{prediction_proba[0][1]:.1%}"
-                        )
-
+                    st.session_state['result'] = predict(record, model_name, shadow_name, threshold)
+                except Overloaded:
+                    st.session_state.pop('result', None)
+                    st.warning('⏳ Many predictions are running right now. Please press Predict again in a moment.')
                 except Exception as e:
+                    st.session_state.pop('result', None)
                     st.error(f"Error making prediction: {str(e)}")
+            # any other rerun (sidebar, what-if, batch scoring) shows the last result without rescoring
+            if 'result' in st.session_state:
+                show_result(st.session_state['result'], model_name, shadow_name, threshold)
+
+        with what_if_tab:
+            show_what_if(model, record, threshold)
 
     except FileNotFoundError:
         st.error("Error: Model file not found. Please ensure the model file exists in the correct location.")
@@ -0,0 +1,151 @@
+"""Bounded scoring queue with deadlines, for bursts of prediction requests.
+
+Requests go into an asyncio.Queue of fixed capacity, served by a set of
+worker tasks that each hand the scoring call to a thread (NumPy and
+scikit-learn release the GIL in their inner loops, so a few threads overlap
+usefully). The event loop runs in its own daemon thread, so ordinary
+threaded callers (Streamlit sessions, the HTTP service's handler threads)
+use run(), and asyncio code can await submit() on the queue's loop.
+
+A request is turned away with Overloaded instead of waiting:
+
+- when the queue is full;
+- when the expected wait (queue depth over workers, times the recent
+  average scoring time) already exceeds its timeout;
+- when its timeout passes while it is still queued or being scored.
+
+Queue depth and the time spent waiting for a worker are recorded through
+metrics (queue_depth gauge, queue_wait stage) and in stats().
+"""
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+
+import metrics
+
+
+class Overloaded(RuntimeError):
+    """The queue could not score the request within its capacity or deadline."""
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'deadline', 'enqueued', 'future')
+
+    def __init__(self, func, args, deadline, future):
+        self.func = func
+        self.args = args
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class ScoringQueue:
+    def __init__(self, capacity=64, workers=4, name='scoring'):
+        self.capacity = capacity
+        self.workers = workers
+        self.name = name
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected_full': 0,
+                       'rejected_deadline': 0, 'expired': 0, 'max_depth': 0}
+        self._service_seconds = None   # moving average of one scoring call
+        self._loop = None
+        self._queue = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # the loop and its threads start on first use, so importing this module stays free
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def serve():
+                asyncio.set_event_loop(loop)
+                self._queue = asyncio.Queue(self.capacity)
+                loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                    self.workers, thread_name_prefix=f'{self.name}-worker'))
+                for _ in range(self.workers):
+                    loop.create_task(self._work())
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=serve, name=f'{self.name}-queue', daemon=True).start()
+            ready.wait()
+            self._loop = loop
+
+    def _expected_wait(self):
+        if self._service_seconds is None:
+            return 0.0
+        return math.ceil((self._queue.qsize() + 1) / self.workers) * self._service_seconds
+
+    def _update_depth(self):
+        depth = self._queue.qsize()
+        self._stats['max_depth'] = max(self._stats['max_depth'], depth)
+        metrics.set_gauge('queue_depth', depth, queue=self.name)
+
+    async def submit(self, func, *args, timeout=None):
+        """Run func(*args) on a worker thread and return its result; must be awaited on this queue's loop."""
+        self._stats['submitted'] += 1
+        now = time.monotonic()
+        deadline = None if timeout is None else now + timeout
+        if deadline is not None and self._expected_wait() > timeout:
+            self._stats['rejected_deadline'] += 1
+            raise Overloaded(f'{self.name} queue is too busy to answer within {timeout * 1000:.0f} ms')
+
+        job = _Job(func, args, deadline, asyncio.get_running_loop().create_future())
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats['rejected_full'] += 1
+            raise Overloaded(f'{self.name} queue is full ({self.capacity} waiting)') from None
+        self._update_depth()
+
+        try:
+            return await asyncio.wait_for(job.future, None if deadline is None else deadline - now)
+        except asyncio.TimeoutError:
+            self._stats['expired'] += 1
+            raise Overloaded(f'{self.name} request timed out after {timeout * 1000:.0f} ms') from None
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            self._update_depth()
+            if job.future.done():
+                # the caller gave up (timed out) while the job was queued
+                continue
+            started = time.monotonic()
+            if metrics.ENABLED:
+                metrics.observe('queue_wait', started - job.enqueued, queue=self.name)
+            try:
+                result = await loop.run_in_executor(None, job.func, *job.args)
+            except Exception as e:
+                self._stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            seconds = time.monotonic() - started
+            self._service_seconds = seconds if self._service_seconds is None else \
+                0.9 * self._service_seconds + 0.1 * seconds
+            self._stats['completed'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def run(self, func, *args, timeout=None):
+        """Blocking form of submit for ordinary threads; raises Overloaded when turned away."""
+        self._start()
+        return asyncio.run_coroutine_threadsafe(self.submit(func, *args, timeout=timeout), self._loop).result()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['capacity'] = self.capacity
+        stats['workers'] = self.workers
+        stats['depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['service_ms'] = (self._service_seconds or 0.0) * 1000
+        return stats
+
+
+# Shared by every Streamlit session in the process, like the prediction cache
+QUEUE = ScoringQueue()
@@ -0,0 +1,339 @@
+"""Append-only audit log of every prediction, for clinical review.
+
+Each prediction becomes one fixed-width 256-byte record (RECORD): when it
+was made, where (app or service), the model, the 24 encoded inputs, the
+risk probability, the threshold and label, and how long it took. Records
+follow a 16-byte header, so a log of any size is read by memory-mapping
+it as a NumPy array, and filters over millions of records are single
+vectorized comparisons.
+
+Callers never touch the disk: record() puts the prediction on a queue and
+returns. A background thread takes whatever has queued up (up to
+batch_size records, or what arrived within flush_interval seconds), packs
+it into one array and appends it with a single write to a file opened
+O_APPEND, then fsyncs. If the queue is ever full the record is dropped and
+counted rather than making the caller wait. A write that fails partway is
+cut back to its last whole record (or, if another process has appended
+since, logging stops), so records never end up misaligned.
+
+CKD_AUDIT_LOG sets the file (default logs/predictions.audit); set it to an
+empty string to turn logging off. `python audit_log.py` queries a log.
+"""
+import argparse
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from features import ENCODER
+
+MAGIC = b'CKDAUDIT'
+VERSION = 1
+SOURCES = ('app', 'service')
+
+RECORD = np.dtype([
+    ('timestamp', '<f8'),                         # seconds since the epoch, UTC
+    ('features', '<f8', (len(ENCODER.names),)),   # encoded exactly as the model saw them
+    ('probability', '<f8'),
+    ('threshold', '<f4'),
+    ('latency_ms', '<f4'),
+    ('prediction', 'u1'),
+    ('source', 'u1'),                             # index into SOURCES
+    ('model', 'S38'),                             # model file name, truncated to 38 bytes
+])
+# magic, version, record size, number of inputs
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u2'), ('itemsize', '<u2'), ('features', '<u4')])
+assert RECORD.itemsize == 256 and HEADER.itemsize == 16
+
+DEFAULT_PATH = os.environ.get('CKD_AUDIT_LOG', os.path.join('logs', 'predictions.audit'))
+
+_STOP = object()
+
+
+def _header():
+    header = np.zeros(1, dtype=HEADER)
+    header[0] = (MAGIC, VERSION, RECORD.itemsize, len(ENCODER.names))
+    return header.tobytes()
+
+
+def _check_header(path, data):
+    if data != _header():
+        raise ValueError(f"{path} is not a version {VERSION} prediction audit log with "
+                         f"{len(ENCODER.names)} inputs")
+
+
+def open_for_append(path):
+    """File descriptor appending to the log at path, creating it (with its header) if needed."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        os.write(fd, _header())
+        return fd
+    except FileExistsError:
+        pass
+    with open(path, 'rb') as file:
+        _check_header(path, file.read(HEADER.itemsize))
+    return os.open(path, os.O_WRONLY | os.O_APPEND)
+
+
+def pack(entries):
+    """Records for a list of (timestamp, source, model, X, proba, labels, threshold, latency_ms)."""
+    rows = sum(len(entry[4]) for entry in entries)
+    records = np.zeros(rows, dtype=RECORD)
+    start = 0
+    for timestamp, source, model, X, proba, labels, threshold, latency_ms in entries:
+        batch = records[start:start + len(proba)]
+        batch['timestamp'] = timestamp
+        batch['source'] = SOURCES.index(source)
+        batch['model'] = os.path.basename(model).encode()[:RECORD['model'].itemsize]
+        batch['features'] = X
+        batch['probability'] = proba
+        batch['prediction'] = labels
+        batch['threshold'] = threshold
+        batch['latency_ms'] = latency_ms
+        start += len(proba)
+    return records
+
+
+class AuditLog:
+    def __init__(self, path=DEFAULT_PATH, batch_size=1024, flush_interval=0.5, maxsize=100_000, fsync=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.error = None   # why the log could not be opened, once that has happened
+        self._stats = {'queued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _start(self):
+        # the writer starts on the first record, so importing this module stays free
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_forever, name='audit-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def record(self, model, X, proba, labels, threshold, latency_ms, source='app'):
+        """Queue one row of X (or a batch) for the log; never blocks on the disk.
+
+        latency_ms is the time the whole request took, shared by every row in it.
+        """
+        if not self.enabled or self.error:
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((time.time(), source, model, np.atleast_2d(X), np.atleast_1d(proba),
+                                    np.atleast_1d(labels), threshold, latency_ms))
+        except queue.Full:
+            self._stats['dropped'] += len(np.atleast_1d(proba))
+            return
+        self._stats['queued'] += len(np.atleast_1d(proba))
+
+    def _write_forever(self):
+        try:
+            fd = open_for_append(self.path)
+        except (OSError, ValueError) as e:
+            # predictions go on without a log rather than fail; stats() shows why
+            self.error = str(e)
+            self._discard_forever()
+            return
+        try:
+            while not self.error:
+                entries = self._take()
+                stop = entries[-1] is _STOP
+                if stop:
+                    entries.pop()
+                if entries:
+                    self._write(fd, entries)
+                for _ in range(len(entries) + stop):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            os.close(fd)
+        self._discard_forever()
+
+    def _discard_forever(self):
+        # count what is still queued as dropped until close() asks the writer to stop
+        while True:
+            entry = self._queue.get()
+            self._queue.task_done()
+            if entry is _STOP:
+                return
+            self._stats['dropped'] += len(entry[4])
+
+    def _take(self):
+        # block for the first entry, then take whatever else arrives within flush_interval
+        entries = [self._queue.get()]
+        rows = 0
+        deadline = time.monotonic() + self.flush_interval
+        while entries[-1] is not _STOP:
+            rows += len(entries[-1][4])
+            if rows >= self.batch_size:
+                break
+            try:
+                entries.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return entries
+
+    def _write(self, fd, entries):
+        data = pack(entries).tobytes()
+        written = 0
+        try:
+            # whole batches go to an O_APPEND descriptor, so the app and the service can share a file
+            while written < len(data):
+                written += os.write(fd, data[written:])
+            if self.fsync:
+                os.fsync(fd)
+        except OSError as e:
+            self._stats['errors'] += 1
+            self._stats['written'] += written // RECORD.itemsize
+            self._stats['dropped'] += len(data) // RECORD.itemsize - written // RECORD.itemsize
+            if written % RECORD.itemsize:
+                self._cut_torn_record(fd, written % RECORD.itemsize, e)
+            return
+        self._stats['written'] += len(data) // RECORD.itemsize
+        self._stats['batches'] += 1
+
+    def _cut_torn_record(self, fd, torn, error):
+        # A write that failed partway (e.g. the disk filled up) left part of a record at the
+        # end, and every record appended after it would be misaligned for read(). Cut it off
+        # if nothing has been appended since; otherwise stop logging rather than add to it.
+        try:
+            end = os.lseek(fd, 0, os.SEEK_CUR)   # just past our last byte, on an O_APPEND fd
+            if os.fstat(fd).st_size == end:
+                os.ftruncate(fd, end - torn)
+                return
+        except OSError:
+            pass
+        self.error = f"{self.path} ends in a partly written record ({error}); logging stopped"
+
+    def flush(self):
+        """Wait until everything queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        stats['path'] = self.path
+        stats['error'] = self.error
+        return stats
+
+
+# Shared by every session and request in the process
+AUDIT = AuditLog()
+
+
+def read(path=DEFAULT_PATH):
+    """Memory-mapped array of every complete record in the log at path."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        _check_header(path, file.read(HEADER.itemsize))
+    # a record still being written (or cut short by a crash) is left out
+    count = (size - HEADER.itemsize) // RECORD.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.itemsize, shape=(count,))
+
+
+def select(records, since=None, until=None, model=None, source=None, prediction=None,
+           min_probability=None, max_probability=None):
+    """Boolean mask of the records matching every filter given; since/until are epoch seconds."""
+    mask = np.ones(len(records), dtype=bool)
+    if since is not None:
+        mask &= records['timestamp'] >= since
+    if until is not None:
+        mask &= records['timestamp'] < until
+    if model is not None:
+        mask &= records['model'] == os.path.basename(model).encode()[:RECORD['model'].itemsize]
+    if source is not None:
+        mask &= records['source'] == SOURCES.index(source)
+    if prediction is not None:
+        mask &= records['prediction'] == prediction
+    if min_probability is not None:
+        mask &= records['probability'] >= min_probability
+    if max_probability is not None:
+        mask &= records['probability'] <= max_probability
+    return mask
+
+
+def to_frame(records):
+    """DataFrame of records with one column per input, times as datetimes."""
+    import pandas as pd
+
+    frame = pd.DataFrame(np.asarray(records['features']), columns=ENCODER.names)
+    frame.insert(0, 'time', pd.to_datetime(records['timestamp'], unit='s', utc=True).round('ms'))
+    frame.insert(1, 'source', np.array(SOURCES)[records['source']])
+    frame.insert(2, 'model', np.char.decode(records['model']))
+    frame.insert(3, 'prediction', records['prediction'])
+    frame.insert(4, 'ckd_probability', records['probability'])
+    frame.insert(5, 'threshold', records['threshold'].round(4))
+    frame.insert(6, 'latency_ms', records['latency_ms'])
+    return frame
+
+
+def _timestamp(text):
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        # times are shown in UTC, so read them back that way whatever the server's time zone
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the prediction audit log')
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH or os.path.join('logs', 'predictions.audit'))
+    parser.add_argument('--since', type=_timestamp, help='ISO date/time, UTC unless it has an offset, e.g. 2024-05-01 or 2024-05-01T08:00')
+    parser.add_argument('--until', type=_timestamp, help='ISO date/time, UTC unless it has an offset (exclusive)')
+    parser.add_argument('--model')
+    parser.add_argument('--source', choices=SOURCES)
+    parser.add_argument('--prediction', type=int, choices=[0, 1])
+    parser.add_argument('--min-probability', type=float)
+    parser.add_argument('--max-probability', type=float)
+    parser.add_argument('--tail', type=int, default=20, help='show the last N matching records (0: none)')
+    parser.add_argument('--csv', help='write every matching record to this CSV')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    records = read(args.path)
+    mask = select(records, args.since, args.until, args.model, args.source, args.prediction,
+                  args.min_probability, args.max_probability)
+    matched = np.flatnonzero(mask)
+    seconds = time.perf_counter() - start
+    print(f"{len(matched):,} of {len(records):,} records match ({seconds * 1000:.1f} ms)")
+    if len(matched):
+        hits = records[matched]
+        print(f"high risk: {int(hits['prediction'].sum()):,}, mean probability {hits['probability'].mean():.3f}, "
+              f"median latency {np.median(hits['latency_ms']):.1f} ms")
+        for name in np.unique(hits['model']):
+            print(f"  {name.decode()}: {int((hits['model'] == name).sum()):,}")
+    if args.tail and len(matched):
+        print(to_frame(records[matched[-args.tail:]]).to_string(index=False))
+    if args.csv:
+        to_frame(records[matched]).to_csv(args.csv, index=False)
+        print(f"wrote {len(matched):,} records to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
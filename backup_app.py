@@ -1,7 +1,8 @@
 import streamlit as st
-import numpy as np
 import pickle
 
+from features import ENCODER
+
 # Page configuration
 st.set_page_config(
     page_title="Chronic Kidney Disease Prediction",
@@ -99,45 +100,13 @@ def main():
                 predict_button = st.button('Predict', use_container_width=True)
 
             if predict_button:
-                # Convert categorical inputs to numeric
-                rbc_num = 1 if rbc == 'abnormal' else 0
-                pc_num = 1 if pc == 'abnormal' else 0
-                pcc_num = 1 if pcc == 'present' else 0
-                ba_num = 1 if ba == 'present' else 0
-                htn_num = 1 if htn == 'yes' else 0
-                dm_num = 1 if dm == 'yes' else 0
-                cad_num = 1 if cad == 'yes' else 0
-                appet_num = 1 if appet == 'poor' else 0
-                pe_num = 1 if pe == 'yes' else 0
-                ane_num = 1 if ane == 'yes' else 0
-
-                # Create input array with correct data types and format
-                input_data = np.array([[
-                    age,                    # age - Int64
-                    bp,                     # bp - Int64
-                    float(sg),             # sg - category
-                    int(al),               # al - category
-                    int(su),               # su - category
-                    rbc_num,               # rbc - category (using numeric conversion)
-                    pc_num,                # pc - category (using numeric conversion)
-                    pcc_num,               # pcc - category (using numeric conversion)
-                    ba_num,                # ba - category (using numeric conversion)
-                    bgr,                   # bgr - Int64
-                    float(bu),            # bu - object (convert to float)
-                    float(sc),            # sc - float64
-                    float(sod),           # sod - object (convert to float)
-                    float(pot),           # pot - float64
-                    float(hemo),          # hemo - float64
-                    float(pcv),           # pcv - object (convert to float)
-                    float(wbcc),          # wbcc - object (convert to float)
-                    float(rbcc),          # rbcc - float64
-                    htn_num,              # htn - category (using numeric conversion)
-                    dm_num,               # dm - category (using numeric conversion)
-                    cad_num,              # cad - category (using numeric conversion)
-                    appet_num,            # appet - category (using numeric conversion)
-                    pe_num,               # pe - category (using numeric conversion)
-                    ane_num,              # ane - category (using numeric conversion)
-                ]])
+                # Encode inputs exactly as the batch scorer does
+                input_data = ENCODER.encode_one({
+                    'age': age, 'bp': bp, 'sg': sg, 'al': al, 'su': su, 'rbc': rbc,
+                    'pc': pc, 'pcc': pcc, 'ba': ba, 'bgr': bgr, 'bu': bu, 'sc': sc,
+                    'sod': sod, 'pot': pot, 'hemo': hemo, 'pcv': pcv, 'wbcc': wbcc, 'rbcc': rbcc,
+                    'htn': htn, 'dm': dm, 'cad': cad, 'appet': appet, 'pe': pe, 'ane': ane,
+                })
 
                 try:
                     prediction = model.predict(input_data)
@@ -0,0 +1,199 @@
+import argparse
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import model_registry
+import scoring
+from features import ENCODER
+
+
+def _attach(df, labels, proba, baseline=None, contributions=None):
+    result = df.copy()
+    result['prediction'] = labels
+    result['ckd_probability'] = proba
+    if contributions is not None:
+        result['ckd_baseline'] = baseline
+        for i, name in enumerate(ENCODER.names):
+            result[f'contribution_{name}'] = contributions[:, i]
+    return result
+
+
+def _score(model, X, threshold, explain):
+    if not len(X):
+        # a header-only CSV comes through as one empty chunk, which sklearn refuses to score
+        labels, proba = np.zeros(0, dtype=int), np.zeros(0)
+        return (labels, proba, proba, np.zeros((0, X.shape[1]))) if explain else (labels, proba)
+    if explain:
+        return scoring.explain(model, X, threshold)
+    return scoring.score(model, X, threshold)
+
+
+def score_frame(model, df, threshold=scoring.DEFAULT_THRESHOLD, shadow=None, explain=False, X=None):
+    """Return a copy of df with prediction and ckd_probability columns appended.
+
+    With a shadow model, its results are added as shadow_prediction and
+    shadow_ckd_probability. With explain, ckd_baseline and one
+    contribution_<feature> column per input are added; they sum to
+    ckd_probability. X, if given, is df already encoded.
+    """
+    if X is None:
+        X = ENCODER.encode_batch(df)
+    result = _attach(df, *_score(model, X, threshold, explain))
+    if shadow is not None:
+        result['shadow_prediction'], result['shadow_ckd_probability'] = scoring.score(shadow, X, threshold)
+    return result
+
+
+def _timed(stage, timings, func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    timings[stage] += time.perf_counter() - start
+    return value
+
+
+def read_chunks(path, chunksize, timings):
+    import pandas as pd  # imported here so --help and importing this module stay quick
+
+    # Columns stay as text so they are written back exactly as read, and so
+    # every chunk parses the same way regardless of which values it holds.
+    reader = pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False)
+    while True:
+        try:
+            yield _timed('read', timings, next, reader)
+        except StopIteration:
+            return
+
+
+def score_chunks(model, chunks, timings, threshold=scoring.DEFAULT_THRESHOLD, explain=False):
+    for chunk in chunks:
+        X = _timed('encode', timings, ENCODER.encode_batch, chunk)
+        yield _attach(chunk, *_timed('predict', timings, _score, model, X, threshold, explain))
+
+
+# Set in each pool worker by _init_worker, so the model crosses the process
+# boundary once per worker rather than once per chunk
+_worker_model = None
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _score_in_worker(chunk, threshold, explain):
+    timings = {'encode': 0.0, 'predict': 0.0}
+    X = _timed('encode', timings, ENCODER.encode_batch, chunk)
+    return _timed('predict', timings, _score, _worker_model, X, threshold, explain), timings
+
+
+def score_chunks_parallel(model, chunks, timings, threshold=scoring.DEFAULT_THRESHOLD, jobs=2, explain=False):
+    """Like score_chunks, with chunks encoded and scored by a pool of jobs processes.
+
+    Results come back in input order. At most 2 * jobs chunks are in flight,
+    so memory stays bounded however far the readers get ahead. Encode and
+    predict timings are summed over the workers, so they can exceed wall time.
+    """
+    # On Linux the workers are forked and share the parent's model pages
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(model,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(_score_in_worker, chunk, threshold, explain)))
+            if len(pending) >= 2 * jobs:
+                yield _collect(pending.popleft(), timings)
+        while pending:
+            yield _collect(pending.popleft(), timings)
+
+
+def _collect(item, timings):
+    chunk, future = item
+    start = time.perf_counter()
+    scores, worker_timings = future.result()
+    timings['wait'] += time.perf_counter() - start
+    for stage, seconds in worker_timings.items():
+        timings[stage] += seconds
+    return _attach(chunk, *scores)
+
+
+def score_csv(model, src, dst, chunksize=100_000, threshold=scoring.DEFAULT_THRESHOLD, jobs=1, explain=False):
+    """Score src into dst chunk by chunk, so memory is bounded by chunksize rather than file size.
+
+    With jobs > 1, chunks are scored across that many worker processes and
+    written in their original order. Returns a throughput report with
+    per-stage seconds.
+    """
+    timings = {'read': 0.0, 'encode': 0.0, 'predict': 0.0, 'write': 0.0}
+    rows = 0
+    start = time.perf_counter()
+    chunks = read_chunks(src, chunksize, timings)
+    if jobs > 1:
+        timings['wait'] = 0.0
+        results = score_chunks_parallel(model, chunks, timings, threshold, jobs, explain)
+    else:
+        results = score_chunks(model, chunks, timings, threshold, explain)
+    for i, result in enumerate(results):
+        _timed('write', timings, result.to_csv, dst, header=(i == 0), index=False)
+        rows += len(result)
+    seconds = time.perf_counter() - start
+
+    report = {
+        'rows': rows,
+        'chunksize': chunksize,
+        'jobs': jobs,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'stage_seconds': timings,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if jobs > 1:
+        # largest worker, once the pool has exited
+        report['worker_peak_rss_mb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return report
+
+
+def format_report(report):
+    stages = ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in report['stage_seconds'].items())
+    return (f"Scored {report['rows']} rows in {report['seconds']:.2f}s "
+            f"({report['rows_per_second']:,.0f} rows/s, chunks of {report['chunksize']}, "
+            f"{report['jobs']} process{'es' if report['jobs'] > 1 else ''})\n"
+            f"Stages: {stages}\n"
+            f"Peak RSS: {report['peak_rss_mb']:.1f} MB"
+            + (f", {report['worker_peak_rss_mb']:.1f} MB per worker" if 'worker_peak_rss_mb' in report else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV of patients laid out like data/df.csv')
+    parser.add_argument('input', help='CSV file to score')
+    parser.add_argument('-o', '--output', default='-', help='where to write the results CSV (default: stdout)')
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL, help='model file name or path')
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='sklearn',
+                        help='flat uses the compiled FlatForest, faster for small files')
+    parser.add_argument('--threshold', type=float, default=scoring.DEFAULT_THRESHOLD,
+                        help='flag a patient when the CKD probability is above this')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='rows read, scored and written at a time')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes scoring chunks in parallel (0: one per core)')
+    parser.add_argument('--explain', action='store_true',
+                        help='add per-feature contributions to the CKD probability')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print the throughput report')
+    args = parser.parse_args(argv)
+
+    model = model_registry.get_model(args.model, compiled=args.engine == 'flat')
+    jobs = args.jobs or os.cpu_count()
+    if args.output == '-':
+        report = score_csv(model, args.input, sys.stdout, args.chunksize, args.threshold, jobs, args.explain)
+    else:
+        with open(args.output, 'w', newline='') as dst:
+            report = score_csv(model, args.input, dst, args.chunksize, args.threshold, jobs, args.explain)
+    if not args.quiet:
+        print(format_report(report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
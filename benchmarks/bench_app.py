@@ -0,0 +1,104 @@
+"""Server CPU spent per user interaction in the Streamlit app.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_app
+    python -m benchmarks.bench_app --baseline <git revision> --sessions 10
+
+Drives app.py headlessly with streamlit.testing and measures the process
+CPU time (all threads) of each script run. One session is a user who edits
+--edits inputs, presses Predict, then moves a what-if slider --tweaks times.
+
+Form inputs only reach the server on submit, so in the current app the
+edits cost nothing and Predict is one run; later reruns show the result
+kept in session state. With --baseline, the app.py of that revision (one
+from before the form) runs the same session, where every edit is a full
+rerun.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import tempfile
+import time
+import warnings
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+EDITS = (('Age (years)', 61), ('Blood Pressure (mm/Hg)', 90), ('Blood Glucose Random (mgs/dl)', 180),
+         ('Blood Urea (mgs/dl)', 70), ('Serum Creatinine (mgs/dl)', 2.4), ('Sodium (mEq/L)', 131),
+         ('Potassium (mEq/L)', 5.1), ('Hemoglobin (gms)', 9.8))
+
+
+def cpu_ms(func):
+    start = time.process_time()
+    func()
+    return (time.process_time() - start) * 1000
+
+
+def session(path, edits, tweaks, form):
+    """CPU ms of each run in one session, by kind of interaction."""
+    at = AppTest.from_file(path, default_timeout=120)
+    runs = {'load': [cpu_ms(at.run)], 'edit': [], 'predict': [], 'tweak': []}
+    for label, value in (EDITS * (edits // len(EDITS) + 1))[:edits]:
+        widget = next(widget for widget in at.number_input if widget.label == label)
+        widget.set_value(value)
+        if not form:
+            runs['edit'].append(cpu_ms(at.run))
+    predict = next(button for button in at.button if button.label == 'Predict')
+    predict.click()
+    runs['predict'].append(cpu_ms(at.run))
+    if at.exception:
+        raise SystemExit(f"{path} failed: {at.exception[0].message}")
+    if not at.metric:
+        raise SystemExit(f"{path} showed no prediction")
+    for i in range(tweaks):
+        points = next(slider for slider in at.slider if slider.label == 'Points per input')
+        points.set_value(20 + i % 2 * 10)
+        runs['tweak'].append(cpu_ms(at.run))
+    return runs
+
+
+def report(name, sessions):
+    total = [sum(sum(values) for kind, values in runs.items() if kind != 'load') for runs in sessions]
+    print(f"{name}: {np.median(total):.0f} ms CPU per session (after the first page load)")
+    for kind in ('edit', 'predict', 'tweak'):
+        values = [value for runs in sessions for value in runs[kind]]
+        if values:
+            print(f"  {kind:<8}{len(values) // len(sessions):>3} runs, {np.median(values):>6.1f} ms each")
+        else:
+            print(f"  {kind:<8}  0 runs")
+    return float(np.median(total))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark server CPU per app interaction')
+    parser.add_argument('--edits', type=int, default=8, help='form inputs changed before Predict')
+    parser.add_argument('--tweaks', type=int, default=5, help='what-if reruns after Predict')
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--baseline', help='git revision whose app.py to compare with')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+    logging.disable(logging.WARNING)   # streamlit's bare-mode and deprecation notices, once per run
+    # keep benchmark predictions out of the real audit log
+    os.environ['CKD_AUDIT_LOG'] = ''
+
+    # the first session warms the model and prediction caches for both apps
+    app = os.path.abspath('app.py')
+    session(app, args.edits, args.tweaks, form=True)
+    current = report('app.py', [session(app, args.edits, args.tweaks, form=True) for _ in range(args.sessions)])
+    if args.baseline:
+        source = subprocess.run(['git', 'show', f'{args.baseline}:app.py'], capture_output=True, text=True,
+                                check=True).stdout
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'app.py')
+            with open(path, 'w') as file:
+                file.write(source)
+            baseline = report(f'{args.baseline}:app.py', [session(path, args.edits, args.tweaks, form=False)
+                                                          for _ in range(args.sessions)])
+        print(f"{1 - current / baseline:.0%} less server CPU per session")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Cost of the prediction audit log (audit_log.py) to callers, the writer and queries.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_audit
+    python -m benchmarks.bench_audit --records 5000000 --calls 50000
+
+- record(): time a prediction spends logging itself, against writing and
+  fsyncing its record synchronously, as an inline logger would;
+- writer: records per second the background thread gets to disk;
+- query: read() plus select() over a log of --records records (written
+  directly, with rows of df.csv, a few models and a year of timestamps),
+  for a handful of typical filters.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import audit_log
+import dataset
+
+
+def per_call_us(func, calls):
+    times = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        times[i] = time.perf_counter() - start
+    return np.median(times) * 1e6, np.percentile(times, 99) * 1e6
+
+
+def synthetic_log(path, X, records, rng, chunk=500_000):
+    fd = audit_log.open_for_append(path)
+    start_time = time.time() - 365 * 86400
+    try:
+        for start in range(0, records, chunk):
+            rows = min(chunk, records - start)
+            batch = np.zeros(rows, dtype=audit_log.RECORD)
+            batch['timestamp'] = start_time + (start + np.arange(rows)) * (365 * 86400 / records)
+            batch['features'] = X[rng.integers(0, len(X), rows)]
+            batch['probability'] = rng.random(rows)
+            batch['prediction'] = batch['probability'] >= 0.5
+            batch['threshold'] = 0.5
+            batch['latency_ms'] = rng.gamma(2.0, 2.0, rows)
+            batch['source'] = rng.integers(0, len(audit_log.SOURCES), rows)
+            batch['model'] = np.array([b'random_forest_model1.pkl', b'ckd_rf_v1.pkl', b'ckd_rf_v2.pkl'])[
+                rng.integers(0, 3, rows)]
+            os.write(fd, batch.tobytes())
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prediction audit log')
+    parser.add_argument('--records', type=int, default=2_000_000, help='size of the log queried')
+    parser.add_argument('--calls', type=int, default=20_000, help='predictions logged for the record() timing')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    X = dataset.load().X
+    proba, labels = np.array([0.8]), np.array([1])
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        log = audit_log.AuditLog(os.path.join(tmp, 'background.audit'))
+        start = time.perf_counter()
+        median, p99 = per_call_us(
+            lambda i: log.record('random_forest_model1.pkl', X[i % len(X)], proba, labels, 0.5, 4.2), args.calls)
+        log.flush()
+        seconds = time.perf_counter() - start
+        stats = log.stats()
+        log.close()
+        print(f"record() with background writer: median {median:.1f} us, p99 {p99:.1f} us per prediction; "
+              f"{stats['written']:,} written in {stats['batches']} batches, "
+              f"{stats['written'] / seconds:,.0f} records/s, {stats['dropped']} dropped")
+
+        fd = audit_log.open_for_append(os.path.join(tmp, 'inline.audit'))
+
+        def inline(i):
+            entry = (time.time(), 'app', 'random_forest_model1.pkl', X[i % len(X)][None], proba, labels, 0.5, 4.2)
+            os.write(fd, audit_log.pack([entry]).tobytes())
+            os.fsync(fd)
+
+        calls = min(args.calls, 2000)
+        median_inline, p99_inline = per_call_us(inline, calls)
+        os.close(fd)
+        print(f"inline write + fsync:            median {median_inline:.1f} us, p99 {p99_inline:.1f} us "
+              f"per prediction ({median_inline / median:.0f}x)")
+
+        path = os.path.join(tmp, 'large.audit')
+        start = time.perf_counter()
+        synthetic_log(path, X, args.records, rng)
+        print(f"\n{args.records:,} records, {os.path.getsize(path) / 2 ** 20:.0f} MB "
+              f"(written in {time.perf_counter() - start:.1f} s)")
+        last_week = time.time() - 7 * 86400
+        queries = {
+            'all high risk': dict(prediction=1),
+            'last 7 days': dict(since=last_week),
+            'one model, service': dict(model='ckd_rf_v2.pkl', source='service'),
+            'last 7 days, p >= 0.95': dict(since=last_week, min_probability=0.95),
+        }
+        print(f"{'query':<26}{'matches':>12}{'scan':>11}")
+        for name, filters in queries.items():
+            start = time.perf_counter()
+            records = audit_log.read(path)
+            matches = int(audit_log.select(records, **filters).sum())
+            print(f"{name:<26}{matches:>12,}{(time.perf_counter() - start) * 1000:>8.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
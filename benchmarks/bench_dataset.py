@@ -0,0 +1,85 @@
+"""Compare parsing data/df.csv with loading it through the dataset column cache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_dataset
+    python -m benchmarks.bench_dataset --scale 1 100 1000
+
+Each scale writes a CSV with the rows of df.csv repeated that many times
+to a temporary directory. Timings are the median of several loads in this
+process; memory is the peak traced allocation of one load (memory-mapped
+columns are not allocations, so the cached load only counts the matrix it
+builds).
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from features import ENCODER
+
+
+def parse_csv(path):
+    df = pd.read_csv(path)
+    return ENCODER.encode_batch(df), df['class'].to_numpy()
+
+
+def load_cached(path):
+    data = dataset.load(path)
+    return data.X, data.y
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def peak_mb(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CSV parsing against the column cache')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    source = pd.read_csv('data/df.csv', dtype=str, keep_default_na=False)
+    print(f"{'rows':>10}{'csv MB':>9}{'parse':>12}{'build cache':>14}{'cached':>12}{'speedup':>9}"
+          f"{'parse peak':>12}{'cached peak':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scale:
+            path = os.path.join(tmp, f'df_x{scale}.csv')
+            pd.concat([source] * scale, ignore_index=True).to_csv(path, index=False)
+            X, y = parse_csv(path)
+
+            start = time.perf_counter()
+            dataset.load(path, rebuild=True)
+            build_ms = (time.perf_counter() - start) * 1000
+            X_cached, y_cached = load_cached(path)
+            if not (np.array_equal(X, X_cached) and np.array_equal(y, y_cached)):
+                raise SystemExit(f"cached columns differ from the parsed CSV at scale {scale}")
+
+            parse = median_ms(lambda: parse_csv(path), args.repeat)
+            cached = median_ms(lambda: load_cached(path), args.repeat)
+            print(f"{len(y):>10,}{os.path.getsize(path) / 2 ** 20:>9.1f}{parse:>9.1f} ms{build_ms:>11.1f} ms"
+                  f"{cached:>9.1f} ms{parse / cached:>8.1f}x"
+                  f"{peak_mb(lambda: parse_csv(path)):>9.1f} MB{peak_mb(lambda: load_cached(path)):>10.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Hash-index deduplication (dedup.py) against comparing every pair of rows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_dedup
+    python -m benchmarks.bench_dedup --scale 1 10 100 1000 --pairwise-max 20000
+
+Each scale repeats the encoded rows of df.csv that many times. Beyond the
+first copy, every row becomes one of: an exact repeat (5%), a near repeat
+with each continuous lab moved by up to a quarter of its bucket width
+(15%), or a new patient with a different blood glucose (the rest). The
+exact and near passes are timed with the hash index and, up to
+--pairwise-max rows, with a pairwise scan that checks each row against all
+earlier ones; both must flag the same rows. 'planted' counts the near
+repeats made, so near/planted is the share not lost to bucket edges.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import dataset
+import dedup
+from features import ENCODER
+
+
+def scaled(X, y, scale, rng):
+    X, y = np.tile(X, (scale, 1)), np.tile(y, scale)
+    extra = slice(len(X) // scale, None)
+    kind = rng.choice(3, size=len(X), p=[0.05, 0.15, 0.8])
+    kind[:len(X) // scale] = 0
+    continuous = [ENCODER.names.index(name) for name in dedup.NEAR_RESOLUTION]
+    width = np.array(list(dedup.NEAR_RESOLUTION.values()))
+    noise = rng.uniform(-0.25, 0.25, (len(X), len(continuous))) * width
+    X[:, continuous] += np.where(kind[:, None] == 1, noise, 0)
+    bgr = ENCODER.names.index('bgr')
+    X[extra, bgr] += np.where(kind[extra] == 2, rng.integers(1, 10_000, len(X))[extra], 0)
+    return X, y, int((kind == 1).sum())
+
+
+def pairwise(X, y):
+    rows = np.column_stack([X, y])
+    duplicate = np.zeros(len(rows), dtype=bool)
+    for i in range(1, len(rows)):
+        duplicate[i] = np.any(np.all(rows[:i] == rows[i], axis=1))
+    return duplicate
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark duplicate detection')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--pairwise-max', type=int, default=10_000,
+                        help='largest row count to run the quadratic pairwise scan on')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    data = dataset.load()
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>10}{'exact':>8}{'near':>8}{'planted':>9}{'hash exact':>13}{'hash near':>12}"
+          f"{'pairwise exact':>17}{'pairwise near':>16}")
+    for scale in args.scale:
+        X, y, planted = scaled(data.X, data.y, scale, rng)
+        exact, hash_exact = timed(lambda: dedup.find_duplicates(X, y))
+        near, hash_near = timed(lambda: dedup.find_near_duplicates(X, y))
+        line = (f"{len(y):>10,}{int(exact.sum()):>8,}{int((near & ~exact).sum()):>8,}{planted:>9,}"
+                f"{hash_exact:>10.1f} ms{hash_near:>9.1f} ms")
+        if len(y) <= args.pairwise_max:
+            pairwise_exact, pair_exact_ms = timed(lambda: pairwise(X, y))
+            pairwise_near, pair_near_ms = timed(lambda: pairwise(dedup.bucket(X), y))
+            if not (np.array_equal(exact, pairwise_exact) and np.array_equal(near, pairwise_near)):
+                raise SystemExit(f"hash index and pairwise scan disagree at scale {scale}")
+            line += f"{pair_exact_ms:>14.1f} ms{pair_near_ms:>13.1f} ms"
+        else:
+            line += f"{'-':>17}{'-':>16}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Cost of per-prediction feature contributions compared with plain predict_proba.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_explain
+    python -m benchmarks.bench_explain --model model.pkl --sizes 1 1000 100000
+
+For each batch size, times sklearn predict_proba, the compiled forest's
+predict_proba and its predict_proba_with_contributions (same traversal,
+plus the contribution bookkeeping), and scoring.explain on the sklearn
+model itself (leaves from each tree, then a walk back up to the root). It
+checks that baseline plus contributions adds up to the probability and
+that both explanations agree.
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+import dataset
+import model_registry
+import scoring
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prediction explanations')
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10_000])
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    model = model_registry.get_model(args.model)
+    flat = model_registry.get_model(args.model, compiled=True)
+    encoded = dataset.load().X
+    rng = np.random.default_rng(0)
+
+    print(f"{args.model}: {flat.n_trees} trees, max depth {flat.max_depth}")
+    print(f"{'rows':>8}{'sklearn proba':>16}{'flat proba':>14}{'flat explain':>15}{'vs flat':>9}{'vs sklearn':>12}"
+          f"{'sklearn explain':>18}{'vs sklearn':>12}")
+    for size in args.sizes:
+        rows = encoded[rng.integers(0, len(encoded), size)]
+        X = scoring.model_input(flat, rows)
+        proba, bias, contributions = flat.predict_proba_with_contributions(X)
+        error = np.abs(bias + contributions.sum(axis=1) - proba).max()
+        if error > 1e-9:
+            raise SystemExit(f"contributions do not add up to the probability (off by {error:g})")
+        for a, b in zip(scoring.explain(flat, rows), scoring.explain(model, rows)):
+            if not np.allclose(a, b, rtol=0, atol=1e-9):
+                raise SystemExit('sklearn and compiled explanations differ')
+
+        repeat = max(5, min(200, 100_000 // size))
+        sk = median_ms(lambda: model.predict_proba(X), repeat)
+        plain = median_ms(lambda: flat.predict_proba(X), repeat)
+        explained = median_ms(lambda: flat.predict_proba_with_contributions(X), repeat)
+        sk_explained = median_ms(lambda: scoring.explain(model, rows), repeat)
+        print(f"{size:>8,}{sk:>13.3f} ms{plain:>11.3f} ms{explained:>12.3f} ms"
+              f"{explained / plain:>8.2f}x{explained / sk:>11.2f}x{sk_explained:>15.3f} ms{sk_explained / sk:>11.2f}x")
+
+
+if __name__ == '__main__':
+    main()
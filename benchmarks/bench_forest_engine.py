@@ -0,0 +1,62 @@
+"""Check FlatForest against sklearn on data/df.csv and compare latency.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_forest_engine
+
+Exits non-zero if any model's compiled predictions differ from sklearn's.
+"""
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+from features import ENCODER
+from forest_engine import FlatForest
+from scoring import model_input
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+def main():
+    warnings.simplefilter('ignore')
+    X = ENCODER.encode_batch(pd.read_csv('data/df.csv'))
+    failed = False
+
+    print(f"{'model':<28}{'parity':>8}{'sklearn 1 row':>15}{'flat 1 row':>12}"
+          f"{'sklearn df.csv':>16}{'flat df.csv':>13}")
+    # .forest files are already compiled and have no sklearn model to check against
+    for name in [name for name in model_registry.list_models() if name.endswith('.pkl')]:
+        model = model_registry.get_model(name)
+        flat = FlatForest.from_sklearn(model)
+        A = model_input(model, X)
+
+        labels, proba = flat.predict_with_proba(A)
+        ok = (np.array_equal(labels, model.predict(A))
+              and np.allclose(proba, model.predict_proba(A), rtol=0, atol=1e-12))
+        failed |= not ok
+
+        row = A[:1]
+        # the app calls predict and predict_proba on the same row
+        sk_row = median_ms(lambda: (model.predict(row), model.predict_proba(row)), 50)
+        flat_row = median_ms(lambda: flat.predict_with_proba(row), 50)
+        sk_all = median_ms(lambda: model.predict_proba(A), 20)
+        flat_all = median_ms(lambda: flat.predict_with_proba(A), 20)
+        print(f"{name:<28}{'ok' if ok else 'FAIL':>8}{sk_row:>12.3f} ms{flat_row:>9.3f} ms"
+              f"{sk_all:>13.3f} ms{flat_all:>10.3f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
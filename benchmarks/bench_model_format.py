@@ -0,0 +1,74 @@
+"""Compare cold-load time and memory of the pickles in model/ with their .forest exports.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_model_format
+
+Each load runs in a fresh interpreter, so import cost (sklearn for pickles,
+numpy only for .forest files) is part of the cold-start numbers.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import model_registry
+import forest_format
+
+# Runs in a child process: argv[1] is the model path, prints one JSON line
+# (ru_maxrss is no use here: a child inherits the parent's peak on Linux)
+LOADER = '''
+import json, os, sys, time
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+start = time.perf_counter()
+base_rss = rss_mb()
+path = sys.argv[1]
+if path.endswith('.forest'):
+    import forest_format
+    imported = time.perf_counter()
+    model = forest_format.load(path)
+else:
+    import joblib, sklearn.ensemble
+    imported = time.perf_counter()
+    model = joblib.load(path)
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'load_ms': (done - imported) * 1000,
+    'rss_mb': rss_mb() - base_rss,
+}))
+'''
+
+
+def cold_load(path, repeat=5):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', LOADER, path], check=True,
+                                capture_output=True, text=True, cwd=os.getcwd()).stdout
+        runs.append(json.loads(output))
+    # median run by total time
+    runs.sort(key=lambda run: run['import_ms'] + run['load_ms'])
+    return runs[len(runs) // 2]
+
+
+def main():
+    print(f"{'model':<28}{'format':>8}{'size':>9}{'imports':>11}{'load':>10}{'RSS growth':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in model_registry.list_models():
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(model_registry.MODEL_DIR, name)
+            exported = forest_format.export(path, os.path.join(tmp, name.replace('.pkl', '.forest')))
+            for label, candidate in (('pickle', path), ('forest', exported)):
+                result = cold_load(candidate)
+                print(f"{name:<28}{label:>8}{os.path.getsize(candidate) / 1024:>6.0f} KB"
+                      f"{result['import_ms']:>8.0f} ms{result['load_ms']:>7.1f} ms{result['rss_mb']:>9.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
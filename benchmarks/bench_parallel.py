@@ -0,0 +1,58 @@
+"""Scaling of batch_predict.score_csv from 1 to N worker processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parallel
+    python -m benchmarks.bench_parallel --rows 2000000 --jobs 1 2 4 8 --engine flat
+
+Writes a CSV of df.csv rows resampled to --rows, scores it once per job
+count, checks every run writes the same output as the single-process run,
+and reports throughput and speedup over one process.
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import warnings
+
+import pandas as pd
+
+import batch_predict
+import model_registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark multi-process batch scoring')
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--jobs', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='sklearn')
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    model = model_registry.get_model(args.model, compiled=args.engine == 'flat')
+    print(f"{args.rows:,} rows, chunks of {args.chunksize:,}, {args.model} ({args.engine}), "
+          f"{os.cpu_count()} cores")
+    print(f"{'jobs':>5}{'seconds':>10}{'rows/s':>12}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'input.csv')
+        source = pd.read_csv('data/df.csv', dtype=str, keep_default_na=False)
+        source.sample(args.rows, replace=True, random_state=0).to_csv(src, index=False)
+
+        baseline = None
+        for jobs in args.jobs:
+            dst = os.path.join(tmp, f'scored_{jobs}.csv')
+            with open(dst, 'w', newline='') as file:
+                report = batch_predict.score_csv(model, src, file, args.chunksize, jobs=jobs)
+            if baseline is None:
+                baseline = (dst, report['seconds'])
+            elif not filecmp.cmp(baseline[0], dst, shallow=False):
+                raise SystemExit(f"output with {jobs} jobs differs from the {args.jobs[0]}-job run")
+            print(f"{jobs:>5}{report['seconds']:>10.2f}{report['rows_per_second']:>12,.0f}"
+                  f"{baseline[1] / report['seconds']:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
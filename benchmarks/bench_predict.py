@@ -0,0 +1,186 @@
+"""End-to-end benchmark of the prediction path.
+
+Measures cold model load for each pickle in model/, feature encoding,
+predict vs predict_proba vs scoring.score on one row, and batch scoring
+(encode + score) at several sizes synthesized from data/df.csv. Reports
+p50/p95/p99 latency, throughput and peak traced memory, and writes the
+results as JSON so runs can be compared across versions.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_predict
+    python -m benchmarks.bench_predict --sizes 1 100 --compare benchmarks/results/previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import model_registry
+import scoring
+from benchmarks.bench_model_format import cold_load
+from features import ENCODER
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return {
+        'repeat': repeat,
+        'p50_ms': float(np.percentile(times, 50)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'p99_ms': float(np.percentile(times, 99)),
+    }
+
+
+def peak_memory_mb(func):
+    # numpy reports its buffers to tracemalloc, so this covers the arrays too
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthesize(df, rows, seed=0):
+    """Resample df.csv rows with replacement to the requested size."""
+    return df.sample(rows, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def run(sizes, engine, model_name):
+    df = pd.read_csv('data/df.csv')
+    record = df[ENCODER.names].iloc[0].to_dict()
+    results = {'cold_load': {}, 'single_row': {}}
+
+    for name in model_registry.list_models():
+        if name.endswith('.pkl'):
+            results['cold_load'][name] = cold_load(os.path.join(model_registry.MODEL_DIR, name), repeat=3)
+
+    results['encode_one'] = measure(lambda: ENCODER.encode_one(record), 2000)
+
+    for name in model_registry.list_models():
+        model = model_registry.get_model(name, compiled=engine == 'flat')
+        row = scoring.model_input(model, ENCODER.encode_one(record))
+        results['single_row'][name] = {
+            'predict': measure(lambda: model.predict(row), 200),
+            'predict_proba': measure(lambda: model.predict_proba(row), 200),
+            'predict_then_predict_proba': measure(lambda: (model.predict(row), model.predict_proba(row)), 200),
+            'score': measure(lambda: scoring.score(model, row), 200),
+        }
+
+    model = model_registry.get_model(model_name, compiled=engine == 'flat')
+    results['batch'] = {}
+    for size in sizes:
+        batch = synthesize(df, size)
+        repeat = max(3, min(200, 200_000 // size))
+
+        def encode_and_score():
+            scoring.score(model, ENCODER.encode_batch(batch))
+
+        timing = measure(encode_and_score, repeat)
+        timing['rows_per_second'] = size / (timing['p50_ms'] / 1000)
+        timing['encode'] = measure(lambda: ENCODER.encode_batch(batch), repeat)
+        timing['peak_memory_mb'] = peak_memory_mb(encode_and_score)
+        results['batch'][str(size)] = timing
+    return results
+
+
+def print_results(results):
+    print('Cold load (fresh interpreter)')
+    for name, load in results['cold_load'].items():
+        print(f"  {name:<28}imports {load['import_ms']:>6.0f} ms  load {load['load_ms']:>6.1f} ms  "
+              f"RSS +{load['rss_mb']:.0f} MB")
+
+    encode = results['encode_one']
+    print(f"encode_one: p50 {encode['p50_ms'] * 1000:.1f} us, p99 {encode['p99_ms'] * 1000:.1f} us")
+
+    print(f"Single row ({results['meta']['engine']}), p50 / p99 ms")
+    for name, calls in results['single_row'].items():
+        cells = '  '.join(f"{call} {timing['p50_ms']:.3f}/{timing['p99_ms']:.3f}" for call, timing in calls.items())
+        print(f"  {name:<28}{cells}")
+
+    print(f"Batch encode + score with {results['meta']['model']}")
+    for size, timing in results['batch'].items():
+        print(f"  {int(size):>9,} rows  p50 {timing['p50_ms']:>9.2f} ms  p95 {timing['p95_ms']:>9.2f} ms  "
+              f"p99 {timing['p99_ms']:>9.2f} ms  {timing['rows_per_second']:>12,.0f} rows/s  "
+              f"peak {timing['peak_memory_mb']:>8.2f} MB")
+
+
+def compare(results, previous_path):
+    with open(previous_path) as file:
+        previous = json.load(file)
+    print(f"Change in p50 vs {previous_path} ({previous['meta'].get('revision')}):")
+    for size, timing in results['batch'].items():
+        before = previous.get('batch', {}).get(size)
+        if before:
+            change = timing['p50_ms'] / before['p50_ms'] - 1
+            print(f"  batch {int(size):>9,} rows  {before['p50_ms']:>9.2f} -> {timing['p50_ms']:>9.2f} ms "
+                  f"({change:+.0%})")
+    for name, calls in results['single_row'].items():
+        before = previous.get('single_row', {}).get(name, {}).get('score')
+        if before:
+            change = calls['score']['p50_ms'] / before['p50_ms'] - 1
+            print(f"  score 1 row {name:<28}{before['p50_ms']:.3f} -> {calls['score']['p50_ms']:.3f} ms "
+                  f"({change:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the end-to-end prediction path')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10_000, 1_000_000])
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='sklearn')
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL, help='model used for batch scoring')
+    parser.add_argument('--output', help=f'JSON file to write (default: {RESULTS_DIR}/<timestamp>.json)')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    created = datetime.now(timezone.utc)
+    results = run(args.sizes, args.engine, args.model)
+    results['meta'] = {
+        'created': created.isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'engine': args.engine,
+        'model': args.model,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, created.strftime('%Y%m%dT%H%M%SZ') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Load-test predict_service on localhost with concurrent single-patient requests.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_service --requests 5000 --concurrency 32
+    python -m benchmarks.bench_service --concurrency 400 --queue-size 64 --deadline-ms 200   # a burst
+
+Requests turned away by the scoring queue (503) are counted, not retried.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import model_registry
+import predict_service
+from async_queue import ScoringQueue
+from features import ENCODER
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='flat')
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--deadline-ms', type=float, default=0.0, help='0: no deadline')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    df = pd.read_csv('data/df.csv')
+    records = df[ENCODER.names].to_dict('records')
+    bodies = [json.dumps(record).encode() for record in records]
+
+    router = predict_service.ModelRouter(model_registry.DEFAULT_MODEL, args.engine == 'flat',
+                                         args.window_ms / 1000)
+    queue = ScoringQueue(args.queue_size, args.workers, name='service')
+    server = predict_service.make_server(port=0, router=router, queue=queue,
+                                         deadline=args.deadline_ms / 1000 or None)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    local = threading.local()
+
+    def request(i):
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        start = time.perf_counter()
+        local.conn.request('POST', '/predict', bodies[i % len(bodies)], {'Content-Type': 'application/json'})
+        response = local.conn.getresponse()
+        response.read()
+        assert response.status in (200, 503), response.status
+        return time.perf_counter() - start, response.status == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    latencies = np.array([latency for latency, ok in results if ok])
+    rejected = sum(not ok for _, ok in results)
+
+    stats = router.get().stats
+    print(f"{args.requests} requests, concurrency {args.concurrency}, engine {args.engine}, "
+          f"window {args.window_ms} ms")
+    print(f"throughput: {len(latencies) / elapsed:,.0f} req/s answered, {rejected} rejected with 503 "
+          f"({rejected / args.requests:.1%})")
+    print(f"latency: p50 {np.percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {np.percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"batches: {stats['batches']}, mean batch size {stats['rows'] / stats['batches']:.1f}")
+    queue_stats = queue.stats()
+    print(f"queue: max depth {queue_stats['max_depth']}/{args.queue_size}, "
+          f"scoring {queue_stats['service_ms']:.1f} ms per request, rejected full {queue_stats['rejected_full']}, "
+          f"over deadline {queue_stats['rejected_deadline'] + queue_stats['expired']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Cold-start cost of the entry points, measured with python -X importtime.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --json benchmarks/results/startup.json
+
+Each scenario runs in a fresh interpreter several times; the fastest run
+is reported (least disturbed by the rest of the machine). For each one it
+shows wall time, the import time Python itself reports, and which of the
+heavy packages (streamlit, pandas, scikit-learn, scipy, joblib) got
+imported, so a stray top-level import shows up as a new name in the
+last column.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import forest_format
+import model_registry
+
+HEAVY = ('streamlit', 'pandas', 'sklearn', 'scipy', 'joblib', 'altair')
+
+
+def scenarios(forest_path):
+    pkl_path = os.path.join(model_registry.MODEL_DIR, model_registry.DEFAULT_MODEL)
+    score_one = 'import scoring, dataset; scoring.score(model, dataset.load().X[:1])'
+    return {
+        'import predict_service': 'import predict_service',
+        'import batch_predict': 'import batch_predict',
+        'import compare_models': 'import compare_models',
+        'import model_registry': 'import model_registry',
+        'score 1 row from .forest': f'import model_registry; model = model_registry.get_model({forest_path!r}); '
+                                    + score_one,
+        'score 1 row from .pkl': f'import model_registry; model = model_registry.get_model({pkl_path!r}); '
+                                 + score_one,
+        # app.py itself renders the page on import, so time what it imports
+        'app imports': 'import streamlit, altair, batch_predict, sweep, prediction_cache',
+    }
+
+
+def run_once(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.getcwd())
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"{code!r} failed:\n{result.stderr[-2000:]}")
+
+    import_us, imported = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):    # top-level imports only, nested ones are included in these
+            import_us += int(cumulative)
+        imported.add(name.strip().split('.')[0])
+    return {'wall_ms': wall_ms, 'import_ms': import_us / 1000,
+            'heavy': [package for package in HEAVY if package in imported]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark entry point start-up time')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        forest_path = forest_format.export(os.path.join(model_registry.MODEL_DIR, model_registry.DEFAULT_MODEL),
+                                           os.path.join(tmp, 'model.forest'))
+        print(f"{'scenario':<28}{'wall':>10}{'imports':>11}  heavy packages")
+        for name, code in scenarios(forest_path).items():
+            runs = [run_once(code) for _ in range(args.repeat)]
+            best = min(runs, key=lambda run: run['wall_ms'])
+            results[name] = best
+            print(f"{name:<28}{best['wall_ms']:>7.0f} ms{best['import_ms']:>8.0f} ms  "
+                  f"{', '.join(best['heavy']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
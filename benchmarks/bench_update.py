@@ -0,0 +1,101 @@
+"""Incremental update (train.py --update) against retraining from scratch.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_update
+    python -m benchmarks.bench_update --new-fraction 0.3 --add-trees 25 --scale 10
+
+df.csv (repeated --scale times, so timings can be seen on more data) is
+split into a held-out test set, a base set the current model was trained
+on and a batch of new rows. Then it times, on base + new rows:
+
+- full retrain: the grid search train.py runs, then refitting the winner;
+- refit: fitting the base model's parameters from scratch, no search;
+- update: checking the new rows against a hash index of the base rows and
+  fitting --add-trees warm-started trees next to the base model's.
+
+and reports each model's accuracy on the held-out rows.
+"""
+import argparse
+import copy
+import time
+import warnings
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+
+import dataset
+import dedup
+import train
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark incremental model updates')
+    parser.add_argument('--new-fraction', type=float, default=0.15, help='share of the training rows that are new')
+    parser.add_argument('--add-trees', type=int, default=10)
+    parser.add_argument('--scale', type=int, default=1, help='repeat df.csv this many times')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=-1)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    data = dataset.load()
+    keep = ~np.asarray(data['is_duplicate'])
+    X, y = np.tile(data.X[keep], (args.scale, 1)), np.tile(data.y[keep], args.scale)
+    # repeated copies are exact duplicates; jitter them so the index and the trees see distinct rows
+    rng = np.random.default_rng(args.seed)
+    X[len(data.y[keep]):] += rng.normal(0, 1e-3, X[len(data.y[keep]):].shape)
+    order = rng.permutation(len(y))
+    test, rest = order[:len(y) // 5], order[len(y) // 5:]
+    split = int(len(rest) * (1 - args.new_fraction))
+    base, new = rest[:split], rest[split:]
+    both = np.concatenate([base, new])
+
+    search = GridSearchCV(RandomForestClassifier(random_state=args.seed), train.PARAM_GRID,
+                          cv=StratifiedKFold(5, shuffle=True, random_state=args.seed), n_jobs=args.jobs)
+    search.fit(X[base], y[base])
+    params = train.choose(search, 0.0)
+    base_model = RandomForestClassifier(random_state=args.seed, n_jobs=1, **params).fit(X[base], y[base])
+    print(f"{len(base)} base rows + {len(new)} new rows, {len(test)} held out; "
+          f"base model {params}")
+
+    def full_retrain():
+        search.fit(X[both], y[both])
+        return RandomForestClassifier(random_state=args.seed, n_jobs=1,
+                                      **train.choose(search, 0.0)).fit(X[both], y[both])
+
+    def refit():
+        return clone(base_model).fit(X[both], y[both])
+
+    def update():
+        index = dedup.DedupIndex()
+        index.add(X[base], y[base])
+        fresh = new[~index.add(X[new], y[new])]
+        # same fitted trees; warm_start appends to the copied list, leaving base_model as it was
+        model = copy.copy(base_model)
+        model.estimators_ = list(base_model.estimators_)
+        model.set_params(warm_start=True, n_estimators=len(base_model.estimators_) + args.add_trees)
+        return model.fit(X[np.concatenate([base, fresh])], y[np.concatenate([base, fresh])])
+
+    print(f"{'':<14}{'seconds':>9}{'trees':>7}{'test accuracy':>15}")
+    print(f"{'base model':<14}{'':>9}{len(base_model.estimators_):>7}"
+          f"{(base_model.predict(X[test]) == y[test]).mean():>15.3f}")
+    results = {}
+    for name, func in (('full retrain', full_retrain), ('refit', refit), ('update', update)):
+        model, seconds = timed(func)
+        results[name] = seconds
+        print(f"{name:<14}{seconds:>9.2f}{len(model.estimators_):>7}{(model.predict(X[test]) == y[test]).mean():>15.3f}")
+    print(f"update is {results['full retrain'] / results['update']:.0f}x faster than a full retrain, "
+          f"{results['refit'] / results['update']:.1f}x faster than a refit")
+
+
+if __name__ == '__main__':
+    main()
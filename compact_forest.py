@@ -0,0 +1,223 @@
+"""Shrink a forest for low-memory deployment and check it still scores the same.
+
+Three steps, each optional except the first:
+
+1. Collapse splits whose two sides end in leaves with the same class
+   probabilities (within --leaf-tolerance; 0 keeps predictions identical).
+   The split node already holds the sample-weighted average of its
+   children, so it simply becomes a leaf.
+2. Keep only as many trees as needed (--tolerance): trees are picked
+   greedily, each time the one that brings the subset's probabilities
+   closest to the full forest's, until accuracy and label agreement on
+   data/df.csv are within tolerance.
+3. Narrow the arrays: thresholds to float32 (rounded down, so x <= t gives
+   the same answer for the float32 inputs the engine compares), split
+   features and child ids to the smallest integer type that fits, and
+   optionally leaf values to float16.
+
+The result is written with forest_format, checked on data/df.csv and not
+saved if accuracy drops by more than the tolerance.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+import dataset
+import forest_format
+import model_registry
+import scoring
+from forest_engine import FlatForest
+
+
+def narrowest_int(max_value):
+    for dtype in (np.uint8, np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def float32_floor(threshold):
+    """Largest float32 <= threshold, so float32 x <= result exactly when x <= threshold."""
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def _fold(forest, node, leaf_tolerance, leaves):
+    # post-order: a split becomes a leaf when both sides are leaves that agree
+    left, right = int(forest.left[node]), int(forest.right[node])
+    if left == node:
+        leaves.add(node)
+        return True
+    left_leaf = _fold(forest, left, leaf_tolerance, leaves)
+    right_leaf = _fold(forest, right, leaf_tolerance, leaves)
+    if left_leaf and right_leaf and np.abs(forest.value[left] - forest.value[right]).max() <= leaf_tolerance:
+        leaves.add(node)
+        return True
+    return False
+
+
+def _emit(forest, node, leaves, out):
+    # pre-order, so the left child of every split is the next node
+    new_id = len(out['feature'])
+    for name in ('feature', 'threshold', 'left', 'right', 'value'):
+        out[name].append(None)
+    out['value'][new_id] = forest.value[node]
+    if node in leaves:
+        out['feature'][new_id], out['threshold'][new_id] = 0, np.inf
+        out['left'][new_id] = out['right'][new_id] = new_id
+        return new_id, 0
+    out['feature'][new_id], out['threshold'][new_id] = forest.feature[node], forest.threshold[node]
+    out['left'][new_id], left_depth = _emit(forest, int(forest.left[node]), leaves, out)
+    out['right'][new_id], right_depth = _emit(forest, int(forest.right[node]), leaves, out)
+    return new_id, 1 + max(left_depth, right_depth)
+
+
+def prune_nodes(forest, trees=None, leaf_tolerance=0.0):
+    """Rebuild forest keeping only the given trees, with redundant splits collapsed."""
+    trees = range(forest.n_trees) if trees is None else trees
+    out = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'value')}
+    roots, max_depth = [], 0
+    for tree in trees:
+        root = int(forest.roots[tree])
+        leaves = set()
+        _fold(forest, root, leaf_tolerance, leaves)
+        new_root, depth = _emit(forest, root, leaves, out)
+        roots.append(new_root)
+        max_depth = max(max_depth, depth)
+
+    return FlatForest(
+        feature=np.asarray(out['feature'], dtype=np.int32),
+        threshold=np.asarray(out['threshold'], dtype=np.float64),
+        children=FlatForest.child_table(np.asarray(out['left']), np.asarray(out['right'])).astype(np.int32),
+        value=np.asarray(out['value'], dtype=np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        max_depth=max_depth,
+        classes=forest.classes_,
+        n_features=forest.n_features_in_,
+    )
+
+
+def select_trees(forest, X, y, tolerance, threshold=scoring.DEFAULT_THRESHOLD):
+    """Greedy smallest subset of trees whose scores on X stay within tolerance of the full forest."""
+    positive = scoring.positive_column(forest)
+    tree_proba = forest.value[forest._leaves(np.ascontiguousarray(X, dtype=np.float32)), positive]
+    full_proba = tree_proba.mean(axis=0)
+    full_labels = scoring.label(full_proba, threshold)
+    full_accuracy = (full_labels == y).mean()
+
+    chosen, total = [], np.zeros(len(X))
+    remaining = list(range(forest.n_trees))
+    while remaining:
+        errors = [np.abs((total + tree_proba[tree]) / (len(chosen) + 1) - full_proba).mean()
+                  for tree in remaining]
+        tree = remaining.pop(int(np.argmin(errors)))
+        chosen.append(tree)
+        total += tree_proba[tree]
+        labels = scoring.label(total / len(chosen), threshold)
+        if (labels == y).mean() >= full_accuracy - tolerance and (labels == full_labels).mean() >= 1 - tolerance:
+            break
+    return sorted(chosen)
+
+
+def narrow(forest, leaf_dtype=np.float32):
+    """Copy of forest stored in the smallest dtypes that keep its decisions."""
+    index_dtype = narrowest_int(len(forest.feature) - 1)
+    return FlatForest(
+        feature=forest.feature.astype(narrowest_int(forest.n_features_in_ - 1)),
+        threshold=float32_floor(np.asarray(forest.threshold, dtype=np.float64)),
+        children=forest.children.astype(index_dtype),
+        value=forest.value.astype(leaf_dtype),
+        roots=forest.roots.astype(index_dtype),
+        max_depth=forest.max_depth,
+        classes=forest.classes_,
+        n_features=forest.n_features_in_,
+    )
+
+
+def compact(forest, X, y, tolerance=0.0, leaf_tolerance=0.0, leaf_dtype=np.float32):
+    trees = select_trees(forest, X, y, tolerance) if tolerance > 0 else None
+    return narrow(prune_nodes(forest, trees, leaf_tolerance), leaf_dtype)
+
+
+def _median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def validate(original, compacted, X, y):
+    X = scoring.model_input(original, X)
+    labels, proba = scoring.score(original, X)
+    new_labels, new_proba = scoring.score(compacted, X)
+    return {
+        'trees': (original.n_trees, compacted.n_trees),
+        'nodes': (len(original.feature), len(compacted.feature)),
+        'memory_kb': (original.nbytes / 1024, compacted.nbytes / 1024),
+        'accuracy': (float((labels == y).mean()), float((new_labels == y).mean())),
+        'agreement': float((labels == new_labels).mean()),
+        'max_probability_change': float(np.abs(proba - new_proba).max()),
+        'row_ms': (_median_ms(lambda: original.predict_proba(X[:1]), 200),
+                   _median_ms(lambda: compacted.predict_proba(X[:1]), 200)),
+        'batch_ms': (_median_ms(lambda: original.predict_proba(X), 20),
+                     _median_ms(lambda: compacted.predict_proba(X), 20)),
+    }
+
+
+def print_report(report):
+    def pair(key, fmt):
+        before, after = report[key]
+        return f"{format(before, fmt)} -> {format(after, fmt)}"
+
+    print(f"  trees        {pair('trees', 'd')}")
+    print(f"  nodes        {pair('nodes', 'd')}")
+    before, after = report['memory_kb']
+    print(f"  memory       {before:.0f} KB -> {after:.0f} KB ({after / before:.0%})")
+    print(f"  accuracy     {pair('accuracy', '.3f')} (labels agree on {report['agreement']:.1%}, "
+          f"max probability change {report['max_probability_change']:.4f})")
+    for key, label in (('row_ms', '1 row'), ('batch_ms', 'df.csv')):
+        before, after = report[key]
+        print(f"  {label:<12} {before:.3f} ms -> {after:.3f} ms ({before / after:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prune and quantize a forest into a compact .forest file')
+    parser.add_argument('model', help='model name in model/ or a path (.pkl or .forest)')
+    parser.add_argument('-o', '--output', help='defaults to <model>.compact.forest next to the model')
+    parser.add_argument('--data', default='data/df.csv', help='labelled data to validate on')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='allowed accuracy drop (and label disagreement) when dropping trees; 0 keeps all')
+    parser.add_argument('--leaf-tolerance', type=float, default=0.0,
+                        help='collapse splits whose leaf probabilities differ by at most this')
+    parser.add_argument('--float16-leaves', action='store_true', help='store class probabilities as float16')
+    args = parser.parse_args(argv)
+
+    model = model_registry.get_model(args.model, compiled=True)
+    data = dataset.load(args.data)
+    X, y = data.X, data.y
+
+    compacted = compact(model, scoring.model_input(model, X), y, args.tolerance, args.leaf_tolerance,
+                        np.float16 if args.float16_leaves else np.float32)
+    report = validate(model, compacted, X, y)
+    print(f"{args.model}:")
+    print_report(report)
+
+    before, after = report['accuracy']
+    if after < before - args.tolerance:
+        print(f"Accuracy dropped by {before - after:.3f}, more than the tolerance; nothing written",
+              file=sys.stderr)
+        sys.exit(1)
+    output = args.output or os.path.splitext(model_registry._resolve(args.model))[0] + '.compact.forest'
+    forest_format.save(compacted, output)
+    print(f"Wrote {output} ({os.path.getsize(output) / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
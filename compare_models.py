@@ -0,0 +1,92 @@
+"""Compare the models in model/ on data/df.csv.
+
+For each model reports file size, forest size, load time, single-row and
+whole-file latency, accuracy against the class column and how often its
+label agrees with a reference model, to pick the smallest/fastest model
+that matches accuracy.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import dataset
+import model_registry
+import scoring
+from forest_engine import FlatForest
+
+
+def _median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def compare(names, reference, data='data/df.csv', compiled=False, threshold=scoring.DEFAULT_THRESHOLD):
+    data = dataset.load(data)
+    X, y = data.X, data.y
+    # import sklearn before timing, otherwise the first model's load time includes it
+    import sklearn.ensemble  # noqa: F401
+
+    rows, labels_by_model = [], {}
+    for name in names:
+        start = time.perf_counter()
+        model = model_registry.get_model(name, compiled)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        labels, _ = scoring.score(model, X, threshold)
+        labels_by_model[name] = labels
+        # .forest files always load as a FlatForest, whatever the engine
+        flat = isinstance(model, FlatForest)
+        trees = model.n_trees if flat else len(model.estimators_)
+        nodes = len(model.feature) if flat else sum(e.tree_.node_count for e in model.estimators_)
+        rows.append({
+            'model': name,
+            'size_kb': os.path.getsize(os.path.join(model_registry.MODEL_DIR, name)) / 1024,
+            'trees': trees,
+            'nodes': nodes,
+            'load_ms': load_ms,
+            'row_ms': _median_ms(lambda: scoring.score(model, X[:1], threshold), 50),
+            'batch_ms': _median_ms(lambda: scoring.score(model, X, threshold), 10),
+            'accuracy': float((labels == y).mean()),
+        })
+
+    # scored last so the reference's load time above is measured cold too
+    reference_labels, _ = scoring.score(model_registry.get_model(reference, compiled), X, threshold)
+    for row in rows:
+        row['agreement'] = float((labels_by_model[row['model']] == reference_labels).mean())
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the models in model/ on data/df.csv')
+    parser.add_argument('models', nargs='*', help='model names (default: every model in model/)')
+    parser.add_argument('--reference', default=model_registry.DEFAULT_MODEL,
+                        help='model the agreement rate is measured against')
+    parser.add_argument('--data', default='data/df.csv')
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='sklearn')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    rows = compare(args.models or model_registry.list_models(), args.reference, args.data,
+                   compiled=args.engine == 'flat')
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"Reference: {args.reference}, engine: {args.engine}, data: {args.data}")
+    print(f"{'model':<28}{'size':>9}{'trees':>7}{'nodes':>7}{'load':>10}{'1 row':>10}{'batch':>10}"
+          f"{'accuracy':>10}{'agree':>8}")
+    for row in rows:
+        print(f"{row['model']:<28}{row['size_kb']:>6.0f} KB{row['trees']:>7}{row['nodes']:>7}"
+              f"{row['load_ms']:>7.1f} ms{row['row_ms']:>7.2f} ms{row['batch_ms']:>7.2f} ms"
+              f"{row['accuracy']:>10.1%}{row['agreement']:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Typed, columnar cache of data/df.csv for everything that reads it.
+
+The first load parses the CSV once, encodes every model input the way
+features.ENCODER does (categoricals as uint8 codes, integer columns in the
+smallest integer type that holds them, floats as float64), and saves one
+.npy file per column under data/.cache/<file name>/. Later loads memory-map
+those files instead of parsing text. The cache records the SHA-256 of the
+CSV it was built from and is rebuilt when the file changes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from features import ENCODER
+
+CACHE_DIR = '.cache'   # next to the CSV, e.g. data/.cache
+LABEL_COLUMNS = ('class', 'is_duplicate')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(path):
+    return os.path.join(os.path.dirname(path) or '.', CACHE_DIR, os.path.basename(path))
+
+
+def _narrow(values):
+    """Smallest integer dtype holding values exactly, or float64 if they are not all integers."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) and np.all(np.isfinite(values)) and np.all(values == np.trunc(values)):
+        for dtype in (np.uint8, np.int8, np.uint16, np.int16, np.int32, np.int64):
+            info = np.iinfo(dtype)
+            if info.min <= values.min() and values.max() <= info.max:
+                return values.astype(dtype)
+    return values
+
+
+class Dataset:
+    """Encoded columns of one CSV, as plain (usually memory-mapped) NumPy arrays."""
+
+    def __init__(self, columns, source=None, sha256=None):
+        self.columns = columns
+        self.source = source
+        self.sha256 = sha256
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def X(self):
+        """The (n, 24) float64 model input, identical to ENCODER.encode_batch on the CSV."""
+        X = np.empty((len(self), len(ENCODER.names)), dtype=np.float64)
+        for i, name in enumerate(ENCODER.names):
+            X[:, i] = self.columns[name]
+        return X
+
+    @property
+    def y(self):
+        return np.asarray(self.columns['class'])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+
+def parse(path):
+    """Read and encode the CSV without touching the cache."""
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    X = ENCODER.encode_batch(df)
+    columns = {name: _narrow(X[:, i]) for i, name in enumerate(ENCODER.names)}
+    if 'class' in df:
+        columns['class'] = _narrow(df['class'].to_numpy())
+    if 'is_duplicate' in df:
+        columns['is_duplicate'] = df['is_duplicate'].to_numpy(dtype=bool)
+    return columns
+
+
+def _atomic_write(directory, name, write):
+    # write to a temp file of our own, then rename, so a reader never maps a half-written file
+    # and two processes building the cache at once never share one
+    fd, temporary = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+        os.chmod(temporary, 0o644)   # mkstemp makes it private; the cache is shared like the CSV
+        os.replace(temporary, os.path.join(directory, name))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _write(directory, columns, sha256):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in columns.items():
+        _atomic_write(directory, f'{name}.npy', lambda file: np.save(file, array))
+    meta = {'sha256': sha256, 'rows': len(next(iter(columns.values()))),
+            'columns': {name: array.dtype.str for name, array in columns.items()}}
+    # meta.json goes last: until it names the new hash the cache counts as stale
+    _atomic_write(directory, 'meta.json', lambda file: file.write(json.dumps(meta, indent=2).encode()))
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def load(path='data/df.csv', mmap=True, rebuild=False):
+    """Load path through its column cache, building or refreshing the cache if needed."""
+    sha256 = file_sha256(path)
+    directory = cache_path(path)
+    meta = None if rebuild else _read_meta(directory)
+
+    if meta is None or meta['sha256'] != sha256:
+        columns = parse(path)
+        _write(directory, columns, sha256)
+        return Dataset(columns, path, sha256)
+
+    mode = 'r' if mmap else None
+    columns = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode)
+               for name in meta['columns']}
+    return Dataset(columns, path, sha256)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect the column cache of a CSV like data/df.csv')
+    parser.add_argument('path', nargs='?', default='data/df.csv')
+    parser.add_argument('--rebuild', action='store_true', help='re-parse the CSV even if the cache is current')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = load(args.path, rebuild=args.rebuild)
+    seconds = time.perf_counter() - start
+    print(f"{args.path}: {len(dataset)} rows, {len(dataset.columns)} columns, "
+          f"{dataset.nbytes / 1024:.0f} KB in {cache_path(args.path)} ({seconds * 1000:.1f} ms)")
+    for name, array in dataset.columns.items():
+        print(f"  {name:<14}{array.dtype.str:>5}")
+
+
+if __name__ == '__main__':
+    main()
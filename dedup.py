@@ -0,0 +1,135 @@
+"""Duplicate detection for the training data by hashing rows.
+
+A row's key is its encoded feature values plus its label, so rows that
+only differ in how a value was written ('1.020' vs '1.02', '\\tyes' vs
+'yes') are duplicates too. Keys go into a dict, so checking n new rows
+against everything seen so far costs O(n) rather than a comparison with
+every earlier row.
+
+Near duplicates use the same index on bucketed rows: the continuous lab
+values (sc, pot, hemo, wbcc, rbcc) are rounded to NEAR_RESOLUTION first,
+so two records of one patient that only differ by measurement noise or
+imputation (sc 1.2 vs 1.23) share a key. Values either side of a bucket
+edge are not matched; that is the price of staying linear.
+
+`python dedup.py` recomputes the is_duplicate column of data/df.csv with
+an exact pass, then a near pass, and reports what each one flagged.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from features import ENCODER
+
+# bucket width of each continuous lab value, in the units of data/df.csv
+NEAR_RESOLUTION = {'sc': 0.1, 'pot': 0.1, 'hemo': 0.1, 'wbcc': 100, 'rbcc': 0.1}
+
+
+def row_keys(X, y):
+    rows = np.column_stack([np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+    # -0.0 and 0.0 encode the same value but not the same bytes
+    rows = np.ascontiguousarray(rows + 0.0)
+    return [row.tobytes() for row in rows]
+
+
+def bucket(X, resolution=NEAR_RESOLUTION):
+    """X with each column named in resolution replaced by its bucket number."""
+    X = np.array(X, dtype=np.float64)
+    for name, width in resolution.items():
+        i = ENCODER.names.index(name)
+        X[:, i] = np.rint(X[:, i] / width)
+    return X
+
+
+class DedupIndex:
+    """Remembers every row it has been given and flags repeats of earlier ones."""
+
+    def __init__(self, resolution=None):
+        self.resolution = resolution   # None for exact keys, else bucket() widths
+        self._first = {}   # key -> number of the first row with it
+        self._rows = 0
+
+    def __len__(self):
+        return len(self._first)
+
+    def add(self, X, y):
+        """Add rows in order; returns True for each row that repeats an earlier one."""
+        if self.resolution is not None:
+            X = bucket(X, self.resolution)
+        duplicate = np.zeros(len(X), dtype=bool)
+        for i, key in enumerate(row_keys(X, y)):
+            if key in self._first:
+                duplicate[i] = True
+            else:
+                self._first[key] = self._rows + i
+        self._rows += len(X)
+        return duplicate
+
+
+def find_duplicates(X, y):
+    """is_duplicate for a whole dataset: every row after the first with the same values and label."""
+    return DedupIndex().add(X, y)
+
+
+def find_near_duplicates(X, y, resolution=NEAR_RESOLUTION):
+    """Every row after the first in its bucket, exact duplicates included."""
+    return DedupIndex(resolution).add(X, y)
+
+
+def passes(X, y, near=True, resolution=NEAR_RESOLUTION):
+    """Run the exact pass, then the near pass; returns the final flags and, per pass, rows flagged and seconds."""
+    report = []
+    start = time.perf_counter()
+    duplicate = find_duplicates(X, y)
+    report.append({'pass': 'exact', 'flagged': int(duplicate.sum()), 'seconds': time.perf_counter() - start})
+    if near:
+        start = time.perf_counter()
+        # bucketing only merges rows, so every exact duplicate is a near one too
+        near_duplicate = find_near_duplicates(X, y, resolution)
+        report.append({'pass': 'near', 'flagged': int((near_duplicate & ~duplicate).sum()),
+                       'seconds': time.perf_counter() - start})
+        duplicate = near_duplicate
+    return duplicate, report
+
+
+def rewrite_flags(path, duplicate):
+    """Replace the is_duplicate column of the CSV at path, leaving every other value as written."""
+    import pandas as pd
+
+    import dataset
+
+    data = pd.read_csv(path, dtype=str, keep_default_na=False)
+    data['is_duplicate'] = np.where(duplicate, 'True', 'False')
+    dataset._atomic_write(os.path.dirname(path) or '.', os.path.basename(path),
+                          lambda file: file.write(data.to_csv(index=False).encode()))
+
+
+def main(argv=None):
+    import dataset
+
+    parser = argparse.ArgumentParser(description='Recompute the is_duplicate column of the training data')
+    parser.add_argument('data', nargs='?', default='data/df.csv')
+    parser.add_argument('--exact-only', action='store_true', help='skip the near-duplicate pass')
+    parser.add_argument('--dry-run', action='store_true', help='report without rewriting the file')
+    args = parser.parse_args(argv)
+
+    data = dataset.load(args.data)
+    before = np.asarray(data['is_duplicate'], dtype=bool)
+    duplicate, report = passes(data.X, data.y, near=not args.exact_only)
+    print(f"{len(data)} rows in {args.data}, {int(before.sum())} flagged before")
+    for step in report:
+        print(f"{step['pass']:<6} pass flagged {step['flagged']:>6} rows in {step['seconds'] * 1000:.1f} ms")
+    print(f"{int(duplicate.sum())} flagged in total, {len(data) - int(duplicate.sum())} rows left for training")
+    if args.dry_run:
+        return
+    if np.array_equal(before, duplicate):
+        print('is_duplicate unchanged')
+        return
+    rewrite_flags(args.data, duplicate)
+    print(f"rewrote is_duplicate in {args.data}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Watch served inputs for values outside, or drifting away from, the training data.
+
+The reference is computed once from data/df.csv (through the dataset
+cache): each input's min/max and about ten bins cut at its deciles, with
+the share of training rows in each. Served rows are then checked and
+counted in constant time and memory per request:
+
+- out of range: a value below the training min or above the training max;
+- drift: the served histogram of an input, compared with the reference by
+  population stability index (PSI), once min_count rows have been seen.
+  PSI above 0.2 is the usual sign of a real shift.
+
+MONITOR is shared by everything in the process; `python drift.py` prints
+the reference, and can replay a CSV through a monitor to summarize it.
+"""
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+import dataset
+import metrics
+from features import ENCODER
+
+BINS = 10
+_EPS = 1e-4   # keeps PSI finite for bins one side never saw
+# the training data, wherever the app or service is started from
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'df.csv')
+
+
+class Reference:
+    """Range and decile histogram of every model input in the training data."""
+
+    def __init__(self, low, high, edges, proportions):
+        self.low = low                  # (inputs,)
+        self.high = high
+        self.edges = edges              # (inputs, BINS - 1) interior bin edges, padded with inf
+        self.proportions = proportions  # (inputs, BINS) share of training rows per bin
+
+    @classmethod
+    def from_data(cls, path=DATA_PATH):
+        X = dataset.load(path).X
+        edges = np.full((X.shape[1], BINS - 1), np.inf)
+        for i, column in enumerate(X.T):
+            # deciles, collapsed where values repeat (categoricals end up with one edge per value)
+            cuts = np.unique(np.quantile(column, np.linspace(0, 1, BINS + 1)[1:-1]))
+            edges[i, :len(cuts)] = cuts
+        counts = _histogram(X, edges)
+        return cls(X.min(axis=0), X.max(axis=0), edges, counts / len(X))
+
+    def bins(self, i):
+        return int(np.isfinite(self.edges[i]).sum()) + 1
+
+
+def _histogram(X, edges):
+    # bin of every value at once: the number of edges below it (padding edges are never below)
+    bins = (X[:, :, None] > edges[None]).sum(axis=2) + np.arange(X.shape[1]) * BINS
+    return np.bincount(bins.ravel(), minlength=edges.shape[0] * BINS).reshape(-1, BINS)
+
+
+def _display(i, value):
+    scale = ENCODER.schema[i].scale or 1
+    return f'{value / scale:g}'
+
+
+class DriftMonitor:
+    def __init__(self, reference=None, min_count=100, psi_threshold=0.2, data=DATA_PATH):
+        self._reference = reference
+        self.min_count = min_count
+        self.psi_threshold = psi_threshold
+        self.data = data
+        self.error = None   # why the reference could not be built, once that has happened
+        self._lock = threading.Lock()
+        self._reference_lock = threading.Lock()
+        self._counts = np.zeros((len(ENCODER.names), BINS), dtype=np.int64)
+        self._out_of_range = np.zeros(len(ENCODER.names), dtype=np.int64)
+        self._seen = 0
+
+    def load(self):
+        """Build the reference now (the app and service call this at start-up); True if it is available.
+
+        Without one, monitoring is off: observe() and check() report nothing and
+        summary() says why, but scoring goes on.
+        """
+        if self._reference is None and self.error is None:
+            with self._reference_lock:
+                if self._reference is None and self.error is None:
+                    try:
+                        self._reference = Reference.from_data(self.data)
+                    except (OSError, ValueError, KeyError) as e:
+                        self.error = f'No drift reference from {self.data}: {e}'
+        return self._reference is not None
+
+    @property
+    def reference(self):
+        # built on first use if load() was not called, so importing this module costs nothing
+        self.load()
+        return self._reference
+
+    def _outside(self, X):
+        reference = self.reference
+        return (X < reference.low) | (X > reference.high)
+
+    def check(self, X):
+        """For each encoded row, the names of the inputs outside the training range."""
+        X = np.atleast_2d(X)
+        if self.reference is None:
+            return [[] for _ in X]
+        outside = self._outside(X)
+        return [[ENCODER.names[i] for i in np.flatnonzero(row)] for row in outside]
+
+    def observe(self, X):
+        """Count the rows in X towards the served histograms; returns check(X)."""
+        X = np.atleast_2d(X)
+        if self.reference is None:
+            return [[] for _ in X]
+        outside = self._outside(X)
+        counts = _histogram(X, self.reference.edges)
+        with self._lock:
+            self._counts += counts
+            self._out_of_range += outside.sum(axis=0)
+            self._seen += len(X)
+        return [[ENCODER.names[i] for i in np.flatnonzero(row)] for row in outside]
+
+    def describe(self, name):
+        """'min - max' of an input in the training data, in form units."""
+        i = ENCODER.names.index(name)
+        return f'{_display(i, self.reference.low[i])} - {_display(i, self.reference.high[i])}'
+
+    def summary(self):
+        """Per input: rows seen, PSI against the reference, whether it drifted, and out-of-range count."""
+        if self.reference is None:
+            return {'rows': 0, 'features': {}, 'error': self.error}
+        with self._lock:
+            counts, out_of_range, seen = self._counts.copy(), self._out_of_range.copy(), self._seen
+        psi = [None] * len(ENCODER.names)
+        if seen:
+            served = np.maximum(counts / seen, _EPS)
+            expected = np.maximum(self.reference.proportions, _EPS)
+            psi = np.sum((served - expected) * np.log(served / expected), axis=1).tolist()
+        features = {}
+        for i, name in enumerate(ENCODER.names):
+            features[name] = {
+                'psi': psi[i],
+                'drifted': psi[i] is not None and seen >= self.min_count and psi[i] > self.psi_threshold,
+                'out_of_range': int(out_of_range[i]),
+                'training_range': self.describe(name),
+            }
+        return {'rows': seen, 'features': features}
+
+    def publish(self):
+        """Copy the summary into metrics gauges (drift_psi, drift_out_of_range) for /metrics."""
+        summary = self.summary()
+        for name, feature in summary['features'].items():
+            if feature['psi'] is not None:
+                metrics.set_gauge('drift_psi', round(feature['psi'], 6), feature=name)
+            metrics.set_gauge('drift_out_of_range', feature['out_of_range'], feature=name)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._counts[:] = 0
+            self._out_of_range[:] = 0
+            self._seen = 0
+
+
+# Shared by every session and request in the process
+MONITOR = DriftMonitor()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show drift reference statistics, or replay a CSV against them')
+    parser.add_argument('--replay', help='CSV laid out like data/df.csv to run through a monitor')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+
+    monitor = DriftMonitor()
+    if not monitor.load():
+        raise SystemExit(monitor.error)
+    if not args.replay:
+        reference = monitor.reference
+        for i, name in enumerate(ENCODER.names):
+            print(f"{name:<7}{monitor.describe(name):>20}  {reference.bins(i):>2} bins")
+        return
+
+    import pandas as pd
+
+    monitor.observe(ENCODER.encode_batch(pd.read_csv(args.replay)))
+    summary = monitor.summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{summary['rows']} rows from {args.replay}")
+    for name, feature in summary['features'].items():
+        flag = 'DRIFT' if feature['drifted'] else ''
+        print(f"{name:<7}PSI {feature['psi']:>7.3f}  out of range {feature['out_of_range']:>6}  "
+              f"(training {feature['training_range']}) {flag}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import numpy as np
+
+
+class Feature:
+    """One model input column: how to read it from a record and turn it into a number."""
+
+    def __init__(self, name, dtype, categories=None, scale=None):
+        self.name = name
+        self.dtype = dtype          # 'int', 'float' or 'category'
+        self.categories = categories  # category -> code, for dtype == 'category'
+        self.scale = scale          # multiplier applied before rounding, e.g. sg 1.015 -> 1015
+
+    def code(self, value):
+        key = str(value).strip().lower()
+        try:
+            return self.categories[key]
+        except KeyError:
+            raise ValueError(f"Unknown value {value!r} for {self.name!r}, "
+                             f"expected one of {', '.join(self.categories)}") from None
+
+
+# The 24 model inputs, in the order the model was trained on
+SCHEMA = (
+    Feature('age', 'int'),
+    Feature('bp', 'int'),
+    Feature('sg', 'int', scale=1000),
+    Feature('al', 'int'),
+    Feature('su', 'int'),
+    Feature('rbc', 'category', {'normal': 0, 'abnormal': 1}),
+    Feature('pc', 'category', {'normal': 0, 'abnormal': 1}),
+    Feature('pcc', 'category', {'notpresent': 0, 'present': 1}),
+    Feature('ba', 'category', {'notpresent': 0, 'present': 1}),
+    Feature('bgr', 'int'),
+    Feature('bu', 'int'),
+    Feature('sc', 'float'),
+    Feature('sod', 'int'),
+    Feature('pot', 'float'),
+    Feature('hemo', 'float'),
+    Feature('pcv', 'int'),
+    Feature('wbcc', 'float'),
+    Feature('rbcc', 'float'),
+    Feature('htn', 'category', {'no': 0, 'yes': 1}),
+    Feature('dm', 'category', {'no': 0, 'yes': 1}),
+    Feature('cad', 'category', {'no': 0, 'yes': 1}),
+    Feature('appet', 'category', {'good': 0, 'poor': 1}),
+    Feature('pe', 'category', {'no': 0, 'yes': 1}),
+    Feature('ane', 'category', {'no': 0, 'yes': 1}),
+)
+
+
+class FeatureEncoder:
+    """Turns patient records into the float64 matrix the model is fed.
+
+    encode_one takes a single {column: value} dict, encode_batch anything
+    column-oriented (a DataFrame or a dict of sequences). Both produce the
+    same numbers for the same input.
+    """
+
+    def __init__(self, schema=SCHEMA):
+        self.schema = tuple(schema)
+        self.names = [feature.name for feature in self.schema]
+
+    def _check(self, columns):
+        missing = [name for name in self.names if name not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    def encode_one(self, record):
+        """Encode one record into a (1, 24) array."""
+        self._check(record)
+        row = np.empty((1, len(self.schema)), dtype=np.float64)
+        for i, feature in enumerate(self.schema):
+            value = record[feature.name]
+            if feature.dtype == 'category':
+                row[0, i] = feature.code(value)
+                continue
+            try:
+                number = float(value)
+                if not np.isfinite(number):
+                    # sklearn and the compiled forest send NaN down different branches
+                    raise ValueError
+                if feature.scale is not None:
+                    row[0, i] = round(number * feature.scale)
+                elif feature.dtype == 'int':
+                    row[0, i] = int(number)
+                else:
+                    row[0, i] = number
+            except (TypeError, ValueError, OverflowError):
+                # None, lists and objects (e.g. from JSON) raise TypeError from float(),
+                # a finite value that overflows once scaled (sg 1e308) OverflowError from round()
+                raise ValueError(f"Invalid value {value!r} for {feature.name!r}, expected a finite number") from None
+        return row
+
+    def encode_batch(self, columns):
+        """Encode a column-oriented batch into an (n, 24) array."""
+        self._check(columns)
+        n = len(columns[self.names[0]])
+        X = np.empty((n, len(self.schema)), dtype=np.float64)
+        for i, feature in enumerate(self.schema):
+            column = columns[feature.name]
+            values = np.asarray(column)
+            if feature.dtype == 'category':
+                # Map each distinct value once, then gather codes for every row.
+                # pandas columns factorize by hashing, much faster than sorting strings.
+                if hasattr(column, 'factorize'):
+                    inverse, uniques = column.factorize(use_na_sentinel=False)
+                else:
+                    uniques, inverse = np.unique(values.astype(str), return_inverse=True)
+                lookup = np.array([feature.code(value) for value in uniques], dtype=np.float64)
+                X[:, i] = lookup[inverse]
+            elif feature.scale is not None:
+                X[:, i] = np.rint(values.astype(np.float64) * feature.scale)
+            elif feature.dtype == 'int':
+                X[:, i] = np.trunc(values.astype(np.float64))
+            else:
+                X[:, i] = values.astype(np.float64)
+        finite = np.isfinite(X)
+        if not finite.all():
+            # blank cells come through as NaN; refuse them rather than score a made-up patient
+            i = int(np.flatnonzero(~finite.all(axis=0))[0])
+            raise ValueError(f"{(~finite[:, i]).sum()} missing or non-finite values for {self.names[i]!r}, "
+                             f"expected finite numbers")
+        return X
+
+
+ENCODER = FeatureEncoder()
@@ -0,0 +1,146 @@
+import numpy as np
+
+# (tree, row) pairs walked per traversal pass; bounds the temporary index arrays
+BLOCK_SIZE = 1 << 16
+
+
+class FlatForest:
+    """A fitted random forest flattened into contiguous node arrays.
+
+    All trees share one set of arrays and node ids are global, so a whole
+    batch walks every tree at once with a handful of NumPy operations per
+    level instead of going through scikit-learn's per-call validation and
+    per-tree dispatch. Leaves point back at themselves, so rows that reach
+    a leaf early simply stay there until the deepest tree is done.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes, n_features):
+        self.feature = feature        # split feature per node (0 at leaves)
+        self.threshold = threshold    # go left when x <= threshold (x as float32)
+        self.children = children      # children[2 * node + went_left] is the next node; leaves point at themselves
+        self.value = value            # class probabilities per node
+        self.roots = roots            # root node id of each tree
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+
+    @staticmethod
+    def child_table(left, right):
+        """Interleave per-node child ids into the table the traversal indexes."""
+        return np.stack([right, left], axis=1).ravel()
+
+    @property
+    def left(self):
+        # views of the child table: the links are held once, and a mapped .forest is not copied
+        return self.children[1::2]
+
+    @property
+    def right(self):
+        return self.children[0::2]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted sklearn RandomForestClassifier."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            ids = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, ids, tree.children_left) + offset)
+            rights.append(np.where(leaf, ids, tree.children_right) + offset)
+            # sklearn averages each tree's normalized leaf distribution
+            value = tree.value[:, 0, :]
+            values.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=cls.child_table(np.concatenate(lefts), np.concatenate(rights)).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _leaves(self, X, contributions=None, value_columns=None):
+        # Each row of the result holds, for one tree, the leaf every input row lands in.
+        # np.take on flat arrays is markedly cheaper than 2-D fancy indexing here.
+        n, n_features = X.shape
+        flat = X.ravel()
+        row_start = np.tile(np.arange(n) * n_features, self.n_trees)
+        node = np.repeat(self.roots, n)
+        for _ in range(self.max_depth):
+            feature = np.take(self.feature, node)
+            slot = row_start + feature
+            go_left = np.take(flat, slot) <= np.take(self.threshold, node)
+            # ids may be stored as narrow as uint8; index in intp so 2 * node cannot overflow
+            child = np.take(self.children, np.intp(2) * node + go_left)
+            if contributions is not None:
+                # credit the change in class probabilities along this edge to the
+                # split feature; slot doubles as the (row, feature) cell to add to
+                for k, column in enumerate(value_columns):
+                    delta = np.take(column, child) - np.take(column, node)
+                    contributions[:, k] += np.bincount(slot, weights=delta, minlength=n * n_features)
+            node = child
+        return node.reshape(self.n_trees, n)
+
+    def _predict(self, X, explain):
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+
+        n_classes = self.value.shape[1]
+        proba = np.empty((len(X), n_classes), dtype=np.float64)
+        contributions = np.zeros((len(X), self.n_features_in_, n_classes)) if explain else None
+        # every node's probabilities sum to 1, so the last class is worked out from the others
+        value_columns = np.ascontiguousarray(self.value[:, :-1].T, dtype=np.float64) if explain else None
+        block_rows = max(1, BLOCK_SIZE // self.n_trees)
+        for start in range(0, len(X), block_rows):
+            block = X[start:start + block_rows]
+            cells = contributions[start:start + len(block)].reshape(-1, n_classes) if explain else None
+            proba[start:start + len(block)] = self.value[self._leaves(block, cells, value_columns)].mean(axis=0, dtype=np.float64)
+        if explain:
+            contributions /= self.n_trees
+            contributions[:, :, -1] = -contributions[:, :, :-1].sum(axis=2)
+        return proba, contributions
+
+    def predict_proba(self, X):
+        return self._predict(X, explain=False)[0]
+
+    def predict_proba_with_contributions(self, X):
+        """Return (proba, bias, contributions) from a single traversal.
+
+        Path-based (Saabas) decomposition: each split a row passes through
+        credits its feature with the change in class probabilities from the
+        split node to the child taken. bias is the forest's average root
+        distribution, shape (n_classes,), contributions has shape
+        (n, n_features, n_classes), and bias + contributions.sum(axis=1)
+        equals proba.
+        """
+        proba, contributions = self._predict(X, explain=True)
+        return proba, self.value[self.roots].mean(axis=0, dtype=np.float64), contributions
+
+    def predict_with_proba(self, X):
+        """Return (labels, probabilities) from a single traversal."""
+        proba = self.predict_proba(X)
+        return self.classes_[proba.argmax(axis=1)], proba
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.children,
+                                               self.value, self.roots))
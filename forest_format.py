@@ -0,0 +1,143 @@
+"""Compact binary model files (.forest) holding a FlatForest's node arrays.
+
+Layout: 8-byte magic, uint32 format version, uint32 header length, a JSON
+header (array dtypes/shapes/offsets, classes, feature schema and a
+SHA-256 of the payload), then the arrays back to back, each aligned to 64
+bytes. Loading memory-maps the file and views the arrays in place (the
+interleaved child table included, exactly as the traversal indexes it),
+so nothing is unpickled or copied and every process mapping the same file
+shares its pages.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import dataset
+from features import ENCODER
+from forest_engine import FlatForest
+
+MAGIC = b'CKDFRST\0'
+VERSION = 2   # 1 stored left and right child ids separately; still readable
+ALIGN = 64
+_PREAMBLE = struct.Struct('<8sII')
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def save(forest, path):
+    arrays = {name: np.ascontiguousarray(getattr(forest, name)) for name in ARRAYS}
+
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    payload = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        payload[start:start + array.nbytes] = array.tobytes()
+
+    header = json.dumps({
+        'arrays': layout,
+        'classes': forest.classes_.tolist(),
+        'classes_dtype': forest.classes_.dtype.str,
+        'max_depth': forest.max_depth,
+        'n_features': forest.n_features_in_,
+        'features': ENCODER.names,
+        'sha256': hashlib.sha256(payload).hexdigest(),
+    }).encode()
+    preamble = _PREAMBLE.pack(MAGIC, VERSION, len(header))
+    padding = _aligned(len(preamble) + len(header)) - len(preamble) - len(header)
+
+    def write(file):
+        file.write(preamble)
+        file.write(header)
+        file.write(b'\0' * padding)
+        file.write(payload)
+
+    # never rewrite a file in place: the app and the service may have it memory-mapped,
+    # and truncating a mapped file kills them with SIGBUS on their next prediction
+    dataset._atomic_write(os.path.dirname(path) or '.', os.path.basename(path), write)
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        magic, version, length = _PREAMBLE.unpack(file.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a .forest model file")
+        if version not in (1, VERSION):
+            raise ValueError(f"{path} has format version {version}, this code reads versions 1 and {VERSION}")
+        header = json.loads(file.read(length))
+    header['version'] = version
+    header['payload_offset'] = _aligned(_PREAMBLE.size + length)
+    return header
+
+
+def load(path, verify=True):
+    """Memory-map a .forest file as a FlatForest; arrays are read-only views of the file."""
+    header = read_header(path)
+    if header['features'] != ENCODER.names:
+        raise ValueError(f"{path} was exported for a different feature schema")
+
+    data = np.memmap(path, dtype=np.uint8, mode='r')[header['payload_offset']:]
+    if verify and hashlib.sha256(data).hexdigest() != header['sha256']:
+        raise ValueError(f"{path} is corrupt: checksum mismatch")
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        start = spec['offset']
+        arrays[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    if 'left' in arrays:
+        # version 1: the child table is built (and copied) at load
+        arrays['children'] = FlatForest.child_table(arrays.pop('left'), arrays.pop('right'))
+
+    return FlatForest(
+        **arrays,
+        max_depth=header['max_depth'],
+        classes=np.array(header['classes'], dtype=header['classes_dtype']),
+        n_features=header['n_features'],
+    )
+
+
+def export(model_path, output=None):
+    """Convert a pickled sklearn forest to a .forest file next to it."""
+    import joblib
+
+    output = output or os.path.splitext(model_path)[0] + '.forest'
+    save(FlatForest.from_sklearn(joblib.load(model_path)), output)
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert pickled forests to .forest files and inspect them')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='convert a pickled model')
+    export_parser.add_argument('model', help='pickled RandomForestClassifier, e.g. model/random_forest_model1.pkl')
+    export_parser.add_argument('-o', '--output', help='defaults to the model path with a .forest suffix')
+    info_parser = commands.add_parser('info', help='print a .forest file header and verify its checksum')
+    info_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        output = export(args.model, args.output)
+        print(f"Wrote {output} ({os.path.getsize(output) / 1024:.0f} KB, "
+              f"was {os.path.getsize(args.model) / 1024:.0f} KB)")
+    else:
+        header = read_header(args.path)
+        forest = load(args.path)
+        print(f"{args.path}: format v{header['version']}, {forest.n_trees} trees, {len(forest.feature)} nodes, "
+              f"max depth {forest.max_depth}, {forest.n_features_in_} inputs, checksum ok")
+        for name, spec in header['arrays'].items():
+            print(f"  {name:<10}{spec['dtype']:>6} {tuple(spec['shape'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Timing spans for the prediction path, aggregated into histograms.
+
+Off unless CKD_METRICS=1 is set (or enable() is called); while off, span()
+returns a shared no-op context manager, so instrumented code pays for one
+function call. Histograms are keyed by stage plus labels such as model
+and batch size, and can be rendered in Prometheus text format or logged
+periodically.
+"""
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+# Upper bounds in seconds, 50 us to 10 s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENABLED = os.environ.get('CKD_METRICS', '').lower() in ('1', 'true', 'yes')
+
+_NOOP = contextlib.nullcontext()
+_histograms = {}   # (stage, ((label, value), ...)) -> [bucket counts..., +Inf count, sum]
+_gauges = {}       # (name, ((label, value), ...)) -> current value
+_lock = threading.Lock()
+_reporter = None
+
+logger = logging.getLogger(__name__)
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def batch_label(rows):
+    """Coarse batch size label so the number of series stays small."""
+    for bound in (1, 10, 100, 1000, 10000):
+        if rows <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+def observe(stage, seconds, **labels):
+    key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+def set_gauge(name, value, **labels):
+    """Record the current value of something that goes up and down, such as a queue depth."""
+    if ENABLED:
+        with _lock:
+            _gauges[(name, tuple(sorted((label, str(v)) for label, v in labels.items())))] = value
+
+
+class _Span:
+    __slots__ = ('stage', 'labels', 'start')
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def span(stage, **labels):
+    """Time the enclosed block as one observation of stage."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(stage, labels)
+
+
+def snapshot():
+    """{(stage, labels): (count, sum_seconds, bucket_counts)} for everything observed so far."""
+    with _lock:
+        items = [(key, list(histogram)) for key, histogram in _histograms.items()]
+    return {key: (sum(histogram[:-1]), histogram[-1], histogram[:-1]) for key, histogram in items}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _gauges.clear()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def render_prometheus(name='ckd_stage_seconds'):
+    lines = [f'# HELP {name} Time spent in each stage of the prediction path.',
+             f'# TYPE {name} histogram']
+    for (stage, labels), (count, total, buckets) in sorted(snapshot().items()):
+        labels = (('stage', stage),) + labels
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    with _lock:
+        gauges = sorted(_gauges.items())
+    for i, ((gauge, labels), value) in enumerate(gauges):
+        if i == 0 or gauges[i - 1][0][0] != gauge:
+            lines.append(f'# TYPE ckd_{gauge} gauge')
+        lines.append(f'ckd_{gauge}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def summary_line():
+    parts = []
+    for (stage, labels), (count, total, _) in sorted(snapshot().items()):
+        label_text = ','.join(f'{name}={value}' for name, value in labels)
+        parts.append(f'{stage}[{label_text}] n={count} mean={total / count * 1000:.2f}ms')
+    return '; '.join(parts) or 'no observations'
+
+
+def start_log_reporter(interval=60.0):
+    """Log summary_line() every interval seconds from a daemon thread (once per process)."""
+    global _reporter
+    with _lock:
+        if _reporter is not None:
+            return
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+        _reporter = threading.Thread(target=_report_forever, args=(interval,), name='metrics-reporter',
+                                     daemon=True)
+    _reporter.start()
+
+
+def _report_forever(interval):
+    while True:
+        time.sleep(interval)
+        logger.info('prediction timings: %s', summary_line())
@@ -0,0 +1,99 @@
+import glob
+import os
+import threading
+import time
+
+import forest_format
+from forest_engine import FlatForest
+
+MODEL_DIR = 'model'
+DEFAULT_MODEL = 'random_forest_model1.pkl'
+
+# Process-wide cache: Streamlit reruns app.py on every widget change, but
+# imported modules stay in sys.modules, so this dict survives reruns and is
+# shared by every session served by the same process.
+_models = {}
+_lock = threading.Lock()
+_stats = {'loads': 0, 'hits': 0, 'invalidations': 0, 'load_seconds': 0.0}
+
+
+def list_models():
+    """Names of the model files in MODEL_DIR, loadable with get_model."""
+    paths = glob.glob(os.path.join(MODEL_DIR, '*.pkl')) + glob.glob(os.path.join(MODEL_DIR, '*.forest'))
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def _resolve(name):
+    if os.path.dirname(name):
+        return name
+    return os.path.join(MODEL_DIR, name)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def model_version(name=DEFAULT_MODEL):
+    """Identifies the current contents of a model file; changes whenever the file is replaced."""
+    path = _resolve(name)
+    mtime_ns, size = _signature(path)
+    return f'{path}@{mtime_ns}:{size}'
+
+
+def _load(path):
+    if path.endswith('.forest'):
+        return forest_format.load(path)
+    # Imported here so that serving .forest files never loads joblib, and
+    # unpickling is what pulls in scikit-learn. joblib.load reads both plain
+    # pickles and joblib dumps (model.pkl is the latter).
+    import joblib
+    return joblib.load(path)
+
+
+def get_model(name=DEFAULT_MODEL, compiled=False):
+    """Return the model stored in model/<name>, unpickling it at most once per file version.
+
+    With compiled=True the forest is returned as a FlatForest, which is much
+    faster than sklearn for single rows and small batches. .forest files
+    always load as a FlatForest.
+    """
+    path = _resolve(name)
+    key = (path, compiled)
+    signature = _signature(path)
+
+    entry = _models.get(key)
+    if entry is not None and entry[0] == signature:
+        with _lock:
+            _stats['hits'] += 1
+        return entry[1]
+
+    with _lock:
+        # another thread may have loaded it while we were waiting
+        entry = _models.get(key)
+        if entry is not None and entry[0] == signature:
+            _stats['hits'] += 1
+            return entry[1]
+        if entry is not None:
+            _stats['invalidations'] += 1
+
+        start = time.perf_counter()
+        model = _load(path)
+        if compiled and not isinstance(model, FlatForest):
+            model = FlatForest.from_sklearn(model)
+        _stats['load_seconds'] += time.perf_counter() - start
+        _stats['loads'] += 1
+        _models[key] = (signature, model)
+        return model
+
+
+def cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['cached_models'] = len(_models)
+    return stats
+
+
+def clear():
+    with _lock:
+        _models.clear()
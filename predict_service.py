@@ -0,0 +1,299 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import metrics
+import model_registry
+import scoring
+from async_queue import Overloaded, ScoringQueue
+from audit_log import AUDIT
+from drift import MONITOR
+from features import ENCODER
+
+
+class _Pending:
+    def __init__(self, X):
+        self.X = X
+        self.proba = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Collects rows from concurrent requests and scores them with one predict_proba call.
+
+    A batch is closed when max_batch rows are waiting or window seconds
+    have passed since its first request arrived, whichever comes first.
+    """
+
+    def __init__(self, model_name, compiled=True, window=0.005, max_batch=512):
+        self.model_name = model_name
+        self.compiled = compiled
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {'requests': 0, 'rows': 0, 'batches': 0}
+        self._queue = queue.Queue()
+        # load now so the first request doesn't pay for it
+        model_registry.get_model(model_name, compiled)
+        threading.Thread(target=self._run, name=f'micro-batcher-{model_name}', daemon=True).start()
+
+    def enqueue(self, X):
+        pending = _Pending(X)
+        self._queue.put(pending)
+        return pending
+
+    @staticmethod
+    def wait(pending):
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.proba
+
+    def submit(self, X):
+        """Block until the rows in X are scored; returns their CKD probabilities."""
+        return self.wait(self.enqueue(X))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0].X)
+        deadline = time.monotonic() + self.window
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            rows += len(pending.X)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                # the registry stats the file each time, so a replaced model is picked up
+                model = model_registry.get_model(self.model_name, self.compiled)
+                X = np.vstack([pending.X for pending in batch])
+                with metrics.span('predict', model=self.model_name, batch=metrics.batch_label(len(X))):
+                    proba = scoring.ckd_probability(model, X)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                continue
+
+            start = 0
+            for pending in batch:
+                pending.proba = proba[start:start + len(pending.X)]
+                start += len(pending.X)
+                pending.done.set()
+            self.stats['requests'] += len(batch)
+            self.stats['rows'] += start
+            self.stats['batches'] += 1
+
+
+class ModelRouter:
+    """One MicroBatcher per model in model/, started the first time a request names it."""
+
+    def __init__(self, default=model_registry.DEFAULT_MODEL, compiled=True, window=0.005, max_batch=512):
+        self.default = default
+        self.compiled = compiled
+        self.window = window
+        self.max_batch = max_batch
+        self.shadow_stats = {}  # 'model|shadow' -> {'compared': rows, 'agreed': rows}
+        self._batchers = {}
+        self._lock = threading.Lock()
+        self.get(default)
+
+    def get(self, name=None):
+        name = name or self.default
+        # only names listed in model/, never arbitrary paths from the request
+        if name not in self._batchers and name not in model_registry.list_models():
+            raise ValueError(f"Unknown model {name!r}")
+        with self._lock:
+            if name not in self._batchers:
+                self._batchers[name] = MicroBatcher(name, self.compiled, self.window, self.max_batch)
+            return self._batchers[name]
+
+    def record_shadow(self, model_name, shadow_name, labels, shadow_labels):
+        key = f'{model_name}|{shadow_name}'
+        with self._lock:
+            stats = self.shadow_stats.setdefault(key, {'compared': 0, 'agreed': 0})
+            stats['compared'] += len(labels)
+            stats['agreed'] += int((labels == shadow_labels).sum())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'default_model': self.default,
+                'models': {name: dict(batcher.stats) for name, batcher in self._batchers.items()},
+                'shadow': {key: dict(stats, agreement=stats['agreed'] / stats['compared'])
+                           for key, stats in self.shadow_stats.items()},
+            }
+
+
+def _score_pair(batcher, shadow, X):
+    # both batches are queued before waiting, so the shadow runs alongside
+    pending = batcher.enqueue(X)
+    shadow_pending = shadow.enqueue(X) if shadow else None
+    return batcher.wait(pending), shadow.wait(shadow_pending) if shadow else None
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    router = None
+    queue = None
+    deadline = None   # seconds a request may wait before it is answered with 503
+    quiet = True
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {'status': 'ok', **self.router.stats(), 'queue': self.queue.stats(),
+                                  'audit': AUDIT.stats()})
+        elif path == '/drift':
+            self._send_json(200, MONITOR.summary())
+        elif path == '/metrics':
+            MONITOR.publish()
+            data = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+            records = payload if isinstance(payload, list) else [payload]
+            if not records or not all(isinstance(record, dict) for record in records):
+                raise ValueError('Expected a patient object or a non-empty list of them')
+            query = parse_qs(url.query)
+            threshold = float(query.get('threshold', [scoring.DEFAULT_THRESHOLD])[0])
+            batcher = self.router.get(query.get('model', [None])[0])
+            shadow = self.router.get(query['shadow'][0]) if 'shadow' in query else None
+            with metrics.span('encode', batch=metrics.batch_label(len(records))):
+                X = np.vstack([ENCODER.encode_one(record) for record in records])
+            out_of_range = MONITOR.observe(X)
+        except (TypeError, ValueError) as e:
+            # json.JSONDecodeError is a ValueError too
+            self._send_json(400, {'error': str(e)})
+            return
+
+        try:
+            with metrics.span('wait', model=batcher.model_name):
+                proba, shadow_proba = self.queue.run(_score_pair, batcher, shadow, X, timeout=self.deadline)
+        except Overloaded as e:
+            self.send_response(503)
+            body = json.dumps({'error': str(e)}).encode()
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        except Exception as e:
+            self._send_json(500, {'error': f'Error making prediction: {e}'})
+            return
+
+        labels = scoring.label(proba, threshold)
+        AUDIT.record(batcher.model_name, X, proba, labels, threshold, (time.perf_counter() - started) * 1000,
+                     source='service')
+        results = [{'model': batcher.model_name, 'prediction': int(prediction), 'ckd_probability': float(p),
+                    'out_of_range': outside}
+                   for prediction, p, outside in zip(labels, proba, out_of_range)]
+        if shadow:
+            shadow_labels = scoring.label(shadow_proba, threshold)
+            self.router.record_shadow(batcher.model_name, shadow.model_name, labels, shadow_labels)
+            for result, prediction, p in zip(results, shadow_labels, shadow_proba):
+                result['shadow'] = {'model': shadow.model_name, 'prediction': int(prediction),
+                                    'ckd_probability': float(p)}
+        self._send_json(200, results if isinstance(payload, list) else results[0])
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8000, router=None, quiet=True, queue=None, deadline=None):
+    """Build (but don't start) the HTTP server; port 0 picks a free port.
+
+    Scoring goes through queue (by default 32 workers in front of 256 slots);
+    with a deadline in seconds, requests that cannot be answered in time get 503.
+    """
+    # the drift reference is built here, not by whichever requests arrive first
+    MONITOR.load()
+    handler = type('Handler', (PredictionHandler,), {
+        'router': router or ModelRouter(),
+        'queue': queue or ScoringQueue(capacity=256, workers=32, name='service'),
+        'deadline': deadline,
+        'quiet': quiet,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve CKD predictions over HTTP/JSON')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL,
+                        help='model used when a request does not pick one with ?model=')
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='flat',
+                        help='flat (default) is much faster for the small batches a service sees')
+    parser.add_argument('--window-ms', type=float, default=5.0,
+                        help='how long to wait for more requests before scoring a batch')
+    parser.add_argument('--max-batch', type=int, default=512, help='rows that close a batch early')
+    parser.add_argument('--workers', type=int, default=32,
+                        help='requests scored concurrently; their rows are batched together')
+    parser.add_argument('--queue-size', type=int, default=256,
+                        help='requests allowed to wait for a worker before new ones get 503')
+    parser.add_argument('--deadline-ms', type=float, default=2000.0,
+                        help='answer 503 instead of scoring when a request would take longer (0: no limit)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='collect stage timings for GET /metrics (same as CKD_METRICS=1)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    router = ModelRouter(args.model, args.engine == 'flat', args.window_ms / 1000, args.max_batch)
+    queue = ScoringQueue(args.queue_size, args.workers, name='service')
+    server = make_server(args.host, args.port, router, quiet=not args.verbose, queue=queue,
+                         deadline=args.deadline_ms / 1000 or None)
+    print(f'Serving {args.model} on http://{args.host}:{server.server_port} '
+          f'(POST /predict, GET /health, GET /drift, GET /metrics)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import model_registry
+import scoring
+
+
+class PredictionCache:
+    """Bounded LRU cache of CKD probabilities keyed by model version and encoded row.
+
+    Entries expire ttl seconds after they were stored. The model version
+    comes from model_registry.model_version, so replacing a model file
+    changes every key for it; entries of the replaced version are dropped
+    the first time the new version is seen.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, probability)
+        self._versions = {}             # model name -> version last seen
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    @staticmethod
+    def key(version, row):
+        digest = hashlib.blake2b(version.encode(), digest_size=16)
+        digest.update(np.ascontiguousarray(row, dtype=np.float64).tobytes())
+        return version, digest.digest()
+
+    def _check_version(self, name, version):
+        previous = self._versions.get(name)
+        if previous is not None and previous != version:
+            self.invalidate(previous)
+        self._versions[name] = version
+
+    def get(self, version, row, explained=False):
+        """The cached probability, or with explained the (probability, baseline, contributions) entry."""
+        key = self.key(version, row)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is not None and explained and not isinstance(entry[1], tuple):
+                # scored without contributions; has to be scored again
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            if not explained and isinstance(entry[1], tuple):
+                return entry[1][0]
+            return entry[1]
+
+    def put(self, version, row, probability):
+        key = self.key(version, row)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, probability)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, version=None):
+        """Drop the entries of one model version, or everything."""
+        with self._lock:
+            stale = [key for key in self._entries if version is None or key[0] == version]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def ckd_probability(self, name, X, compiled=False):
+        """Like scoring.ckd_probability for model_registry model name, scoring only uncached rows."""
+        version = model_registry.model_version(name)
+        self._check_version(name, version)
+
+        proba = np.empty(len(X), dtype=np.float64)
+        missing = []
+        for i, row in enumerate(X):
+            cached = self.get(version, row)
+            if cached is None:
+                missing.append(i)
+            else:
+                proba[i] = cached
+
+        if missing:
+            model = model_registry.get_model(name, compiled)
+            proba[missing] = scoring.ckd_probability(model, X[missing])
+            for i in missing:
+                self.put(version, X[i], float(proba[i]))
+        return proba
+
+    def score(self, name, X, threshold=scoring.DEFAULT_THRESHOLD, compiled=False):
+        proba = self.ckd_probability(name, X, compiled)
+        return scoring.label(proba, threshold), proba
+
+    def explain(self, name, X, threshold=scoring.DEFAULT_THRESHOLD, compiled=False):
+        """Like scoring.explain for model_registry model name, explaining only uncached rows.
+
+        The contributions are cached with the probability, so a repeat costs no
+        pass through the trees, and later score() calls for the row hit too.
+        """
+        version = model_registry.model_version(name)
+        self._check_version(name, version)
+
+        proba, baseline = np.empty(len(X)), np.empty(len(X))
+        contributions = np.empty(X.shape)
+        missing = []
+        for i, row in enumerate(X):
+            cached = self.get(version, row, explained=True)
+            if cached is None:
+                missing.append(i)
+            else:
+                proba[i], baseline[i], contributions[i] = cached
+
+        if missing:
+            model = model_registry.get_model(name, compiled)
+            _, proba[missing], baseline[missing], contributions[missing] = scoring.explain(model, X[missing])
+            for i in missing:
+                self.put(version, X[i], (float(proba[i]), float(baseline[i]), contributions[i].copy()))
+        return scoring.label(proba, threshold), proba, baseline, contributions
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# Shared by every session in the process, like the model registry
+CACHE = PredictionCache()
@@ -1,7 +1,8 @@
 import streamlit as st
-import numpy as np
 import pickle
 
+from features import ENCODER
+
 st.set_page_config(
     page_title="Chronic Kidney Disease Prediction",
     page_icon="🏥",
@@ -94,43 +95,12 @@ def main():
                 predict_button = st.button('Predict', use_container_width=True)
 
             if predict_button:
-                rbc_num = 1 if rbc == 'abnormal' else 0
-                pc_num = 1 if pc == 'abnormal' else 0
-                pcc_num = 1 if pcc == 'present' else 0
-                ba_num = 1 if ba == 'present' else 0
-                htn_num = 1 if htn == 'yes' else 0
-                dm_num = 1 if dm == 'yes' else 0
-                cad_num = 1 if cad == 'yes' else 0
-                appet_num = 1 if appet == 'poor' else 0
-                pe_num = 1 if pe == 'yes' else 0
-                ane_num = 1 if ane == 'yes' else 0
-
-                input_data = np.array([[
-                    int(age),              # age - Int64
-                    int(bp),               # bp - Int64
-                    int(sg * 1000),        # sg - int64 (converting from float to int by multiplying by 1000)
-                    int(al),               # al - int64
-                    int(su),               # su - int64
-                    int(rbc_num),          # rbc - int64
-                    int(pc_num),           # pc - int64
-                    int(pcc_num),          # pcc - int64
-                    int(ba_num),           # ba - int64
-                    int(bgr),              # bgr - Int64
-                    int(bu),               # bu - Int64
-                    float(sc),             # sc - float64
-                    int(sod),              # sod - Int64
-                    float(pot),            # pot - float64
-                    float(hemo),           # hemo - float64
-                    int(pcv),              # pcv - Int64
-                    float(wbcc),           # wbcc - float64
-                    float(rbcc),           # rbcc - float64
-                    int(htn_num),          # htn - int64
-                    int(dm_num),           # dm - int64
-                    int(cad_num),          # cad - int64
-                    int(appet_num),        # appet - int64
-                    int(pe_num),           # pe - int64
-                    int(ane_num),          # ane - int64
-                ]])
+                input_data = ENCODER.encode_one({
+                    'age': age, 'bp': bp, 'sg': sg, 'al': al, 'su': su, 'rbc': rbc,
+                    'pc': pc, 'pcc': pcc, 'ba': ba, 'bgr': bgr, 'bu': bu, 'sc': sc,
+                    'sod': sod, 'pot': pot, 'hemo': hemo, 'pcv': pcv, 'wbcc': wbcc, 'rbcc': rbcc,
+                    'htn': htn, 'dm': dm, 'cad': cad, 'appet': appet, 'pe': pe, 'ane': ane,
+                })
 
                 try:
                     prediction = model.predict(input_data)
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Flag a patient when the CKD probability is above this. 0.5 gives the same
+# labels as model.predict; lower it to catch more cases at the cost of more
+# false alarms.
+DEFAULT_THRESHOLD = 0.5
+
+
+def positive_column(model):
+    """Index of the CKD class (label 1) in the model's predict_proba output."""
+    return int(np.flatnonzero(model.classes_ == 1)[0])
+
+
+def model_input(model, X):
+    """Adapt encoded rows to the model's input width.
+
+    model.pkl and random_forest_model.pkl were trained with the class column
+    as a 25th input; they get the same dummy 1 backuo_app1.py feeds them.
+    """
+    if model.n_features_in_ == X.shape[1] + 1:
+        return np.append(X, np.ones((len(X), 1)), axis=1)
+    return X
+
+
+def ckd_probability(model, X):
+    return model.predict_proba(model_input(model, X))[:, positive_column(model)]
+
+
+def label(proba, threshold=DEFAULT_THRESHOLD):
+    return (proba > threshold).astype(int)
+
+
+def score(model, X, threshold=DEFAULT_THRESHOLD):
+    """Run the forest once over X and return (labels, ckd_probability).
+
+    The label is derived from the probability, so there is no second pass
+    through the trees as with calling predict and predict_proba.
+    """
+    proba = ckd_probability(model, X)
+    return label(proba, threshold), proba
+
+
+def _tree_contributions(model, X):
+    """predict_proba_with_contributions for a fitted sklearn forest, without compiling it.
+
+    Each tree finds the leaves of X as in predict_proba, then every row walks
+    from its leaf back to the root, crediting each parent's feature with the
+    change in class probability from parent to child, as FlatForest does.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    value = np.concatenate([tree.value[:, 0, :] for tree in trees])
+    value = value / value.sum(axis=1, keepdims=True)
+    feature = np.concatenate([tree.feature for tree in trees])
+    parent = np.full(len(value), -1)
+    for tree, offset in zip(trees, offsets):
+        internal = np.flatnonzero(tree.children_left != -1)
+        parent[tree.children_left[internal] + offset] = internal + offset
+        parent[tree.children_right[internal] + offset] = internal + offset
+
+    # sklearn trees split on float32 inputs
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
+    leaves = np.stack([tree.apply(X32) + offset for tree, offset in zip(trees, offsets)])
+    proba = value[leaves].sum(axis=0)
+
+    contributions = np.zeros((len(X), model.n_features_in_, len(model.classes_)))
+    node, row = leaves.ravel(), np.tile(np.arange(len(X)), len(trees))
+    while len(node):
+        up = parent[node]
+        keep = up >= 0
+        node, up, row = node[keep], up[keep], row[keep]
+        np.add.at(contributions, (row, feature[up]), value[node] - value[up])
+        node = up
+    n_trees = len(trees)
+    return proba / n_trees, value[offsets[:-1]].sum(axis=0) / n_trees, contributions / n_trees
+
+
+def explain(model, X, threshold=DEFAULT_THRESHOLD):
+    """Score X with a forest and split each CKD probability across the inputs.
+
+    Returns (labels, ckd_probability, baseline, contributions) from one pass
+    through the trees: a compiled FlatForest walks them itself, an sklearn
+    forest finds its leaves with tree_.apply and walks back up to the root
+    (_tree_contributions). contributions has one column per encoded
+    feature and baseline + contributions.sum(axis=1) == ckd_probability. The
+    dummy input of the 25-input pickles is the same for every patient, so its
+    share is folded into baseline.
+    """
+    positive = positive_column(model)
+    if hasattr(model, 'predict_proba_with_contributions'):
+        proba, bias, contributions = model.predict_proba_with_contributions(model_input(model, X))
+    else:
+        proba, bias, contributions = _tree_contributions(model, model_input(model, X))
+    contributions = contributions[:, :, positive]
+    baseline = np.full(len(X), bias[positive])
+    if contributions.shape[1] > X.shape[1]:
+        baseline += contributions[:, X.shape[1]:].sum(axis=1)
+        contributions = contributions[:, :X.shape[1]]
+    proba = proba[:, positive]
+    return label(proba, threshold), proba, baseline, contributions
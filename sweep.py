@@ -0,0 +1,58 @@
+"""What-if sweeps: vary one or two inputs of a patient over a grid.
+
+The whole grid is laid out as one batch (one row per point, every other
+input held at the patient's value), encoded with features.ENCODER and
+scored with a single predict_proba call, so a 50 x 50 heatmap costs one
+forest pass rather than 2500 predictions.
+"""
+import numpy as np
+import pandas as pd
+
+import dataset
+import scoring
+from features import ENCODER
+
+# Inputs with a numeric scale worth sweeping
+SWEEPABLE = [feature.name for feature in ENCODER.schema if feature.dtype != 'category']
+_FEATURES = {feature.name: feature for feature in ENCODER.schema}
+
+
+def data_range(name, path='data/df.csv'):
+    """(min, max) of an input in the reference data, in the units the form uses."""
+    column = np.asarray(dataset.load(path)[name], dtype=np.float64)
+    scale = _FEATURES[name].scale or 1
+    return float(column.min()) / scale, float(column.max()) / scale
+
+
+def grid_values(name, start, stop, points):
+    """points evenly spaced values from start to stop; integer inputs get each whole value once."""
+    values = np.linspace(start, stop, points)
+    feature = _FEATURES[name]
+    if feature.dtype == 'int':
+        step = 1 / (feature.scale or 1)
+        values = np.unique(np.round(values / step) * step)
+    return values
+
+
+def sweep(model, record, axes):
+    """Score record with the inputs in axes ({name: values}, one or two) varied over their grid.
+
+    Returns a DataFrame with one column per swept input and ckd_probability,
+    one row per grid point.
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError('Sweep one or two inputs')
+    unknown = [name for name in axes if name not in SWEEPABLE]
+    if unknown:
+        raise ValueError(f"Cannot sweep {', '.join(unknown)}; choose from {', '.join(SWEEPABLE)}")
+
+    mesh = np.meshgrid(*[np.asarray(values, dtype=np.float64) for values in axes.values()], indexing='ij')
+    points = mesh[0].size
+    columns = {name: np.full(points, record[name], dtype=object) for name in ENCODER.names}
+    for name, values in zip(axes, mesh):
+        columns[name] = values.ravel()
+
+    X = ENCODER.encode_batch(columns)
+    result = pd.DataFrame({name: columns[name] for name in axes})
+    result['ckd_probability'] = scoring.ckd_probability(model, X)
+    return result
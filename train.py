@@ -0,0 +1,288 @@
+"""Train a versioned CKD random forest from data/df.csv.
+
+Runs a cross-validated grid search over forest size and depth on all
+cores, then writes model/ckd_rf_v<N>.pkl, its .forest export and a
+ckd_rf_v<N>.json report (data hash, parameters, CV results, test
+metrics, model size and per-row latency).
+
+With --update NEW.csv, the labelled rows of NEW.csv are appended to the
+data (repeats of earlier rows flagged as is_duplicate) and the latest
+model grows a few warm-started trees fitted on the combined data, instead
+of searching and refitting everything; it is saved as the next version,
+and only then are the rows appended, so a failed fit leaves the data as it was.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, recall_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+
+import dataset
+import dedup
+import forest_format
+import model_registry
+import scoring
+from features import ENCODER
+from forest_engine import FlatForest
+
+PARAM_GRID = {
+    'n_estimators': [10, 25, 50, 100],
+    'max_depth': [3, 5, 8, None],
+    'min_samples_leaf': [1, 5],
+}
+
+
+def load_training_data(path):
+    data = dataset.load(path)
+    # is_duplicate can be stale (it misses repeats added by hand since it was last written),
+    # and a repeat that lands in both splits inflates the held-out scores
+    keep = ~(dedup.find_duplicates(data.X, data.y) | np.asarray(data['is_duplicate'], dtype=bool))
+    return data.X[keep], data.y[keep], int((~keep).sum()), data.sha256
+
+
+def next_version(model_dir):
+    versions = [int(match.group(1)) for path in glob.glob(os.path.join(model_dir, 'ckd_rf_v*.pkl'))
+                if (match := re.search(r'ckd_rf_v(\d+)\.pkl$', path))]
+    return max(versions, default=0) + 1
+
+
+def latest_model(model_dir):
+    version = next_version(model_dir) - 1
+    if version == 0:
+        raise FileNotFoundError(f"No ckd_rf_v*.pkl in {model_dir} to update; train one first")
+    return f'ckd_rf_v{version}.pkl'
+
+
+def read_new_rows(new_data, data):
+    """Read the rows of new_data and flag any that repeat a row of data (or an earlier new one).
+
+    Returns the encoded new rows, their labels, their is_duplicate flags and
+    the rows as text, laid out like data, for append_rows.
+    """
+    import pandas as pd
+
+    existing = dataset.load(data)
+    index = dedup.DedupIndex()
+    index.add(existing.X, existing.y)
+
+    with open(data) as file:
+        columns = file.readline().strip().split(',')
+    # read as text so values are appended exactly as written
+    new = pd.read_csv(new_data, dtype=str, keep_default_na=False)
+    missing = [name for name in columns if name != 'is_duplicate' and name not in new]
+    if missing:
+        raise ValueError(f"{new_data} is missing columns: {', '.join(missing)}")
+    # encoded from pandas' own number parsing, exactly as dataset.load will read them back once appended
+    parsed = pd.read_csv(new_data)
+    X, y = ENCODER.encode_batch(parsed), parsed['class'].to_numpy().astype(int)
+    duplicate = index.add(X, y)
+
+    rows = new[[name for name in columns if name != 'is_duplicate']].assign(is_duplicate=duplicate)
+    return X, y, duplicate, rows[columns]
+
+
+def append_rows(rows, data):
+    rows.to_csv(data, mode='a', header=False, index=False)
+
+
+def _size_rank(params):
+    # smaller forests are faster and lighter; unlimited depth counts as deepest
+    return params['n_estimators'], params['max_depth'] or np.inf, -params['min_samples_leaf']
+
+
+def choose(search, tolerance):
+    """Smallest candidate whose mean CV accuracy is within tolerance of the best."""
+    results = search.cv_results_
+    best = results['mean_test_score'].max()
+    eligible = [params for params, score in zip(results['params'], results['mean_test_score'])
+                if score >= best - tolerance]
+    return min(eligible, key=_size_rank)
+
+
+def per_row_latency_ms(model, X, repeat=200):
+    times = []
+    for i in range(repeat):
+        row = X[i % len(X)][None, :]
+        start = time.perf_counter()
+        scoring.score(model, row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def train(data='data/df.csv', model_dir=model_registry.MODEL_DIR, tolerance=0.0, folds=5,
+          test_size=0.2, seed=42, jobs=-1):
+    X, y, duplicates, data_sha256 = load_training_data(data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, stratify=y,
+                                                        random_state=seed)
+
+    search = GridSearchCV(
+        RandomForestClassifier(random_state=seed),
+        PARAM_GRID,
+        cv=StratifiedKFold(folds, shuffle=True, random_state=seed),
+        scoring='accuracy',
+        n_jobs=jobs,
+    )
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - start
+
+    params = choose(search, tolerance)
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params).fit(X_train, y_train)
+    flat = FlatForest.from_sklearn(model)
+    predictions, _ = scoring.score(model, X_test)
+
+    version = next_version(model_dir)
+    name = f'ckd_rf_v{version}'
+    pkl_path = os.path.join(model_dir, f'{name}.pkl')
+    forest_path = os.path.join(model_dir, f'{name}.forest')
+    joblib.dump(model, pkl_path)
+    forest_format.save(flat, forest_path)
+
+    report = {
+        'model': name,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'data': {'path': data, 'sha256': data_sha256, 'rows': int(len(y)),
+                 'duplicates_dropped': duplicates, 'train_rows': int(len(y_train)),
+                 'test_rows': int(len(y_test))},
+        'search': {
+            'grid': PARAM_GRID, 'folds': folds, 'seed': seed, 'tolerance': tolerance,
+            'seconds': search_seconds,
+            'best_params': search.best_params_, 'best_cv_accuracy': float(search.best_score_),
+            'candidates': [
+                {'params': params_, 'cv_accuracy': float(score), 'cv_std': float(std),
+                 'fit_seconds': float(fit)}
+                for params_, score, std, fit in zip(
+                    search.cv_results_['params'], search.cv_results_['mean_test_score'],
+                    search.cv_results_['std_test_score'], search.cv_results_['mean_fit_time'])
+            ],
+        },
+        'chosen_params': params,
+        'test': {
+            'accuracy': float(accuracy_score(y_test, predictions)),
+            'recall': float(recall_score(y_test, predictions)),
+            'f1': float(f1_score(y_test, predictions)),
+            'confusion_matrix': confusion_matrix(y_test, predictions).tolist(),
+        },
+        'size': {
+            'trees': flat.n_trees,
+            'nodes': int(len(flat.feature)),
+            'pkl_bytes': os.path.getsize(pkl_path),
+            'forest_bytes': os.path.getsize(forest_path),
+        },
+        'latency_ms_per_row': {
+            'sklearn': per_row_latency_ms(model, X_test),
+            'flat': per_row_latency_ms(flat, X_test),
+        },
+    }
+    with open(os.path.join(model_dir, f'{name}.json'), 'w') as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def update(new_data, data='data/df.csv', model_dir=model_registry.MODEL_DIR, base=None, add_trees=10):
+    base = base or latest_model(model_dir)
+    model = joblib.load(os.path.join(model_dir, base))
+    trees_before = len(model.estimators_)
+
+    X_old, y_old, old_duplicates, _ = load_training_data(data)
+    X_new, y_new, duplicate, rows = read_new_rows(new_data, data)
+    # how well the current model did on the new patients before it saw them
+    unseen_accuracy = float((scoring.score(model, X_new[~duplicate])[0] == y_new[~duplicate]).mean()) \
+        if (~duplicate).any() else None
+
+    # the same rows load_training_data will read once the new ones are appended
+    X, y = np.vstack([X_old, X_new[~duplicate]]), np.concatenate([y_old, y_new[~duplicate]])
+    duplicates = old_duplicates + int(duplicate.sum())
+    start = time.perf_counter()
+    # warm_start keeps the fitted trees and only fits the extra ones, on all the data
+    model.set_params(warm_start=True, n_estimators=trees_before + add_trees, n_jobs=1)
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - start
+    model.set_params(warm_start=False)
+    flat = FlatForest.from_sklearn(model)
+
+    version = next_version(model_dir)
+    name = f'ckd_rf_v{version}'
+    pkl_path = os.path.join(model_dir, f'{name}.pkl')
+    forest_path = os.path.join(model_dir, f'{name}.forest')
+    joblib.dump(model, pkl_path)
+    forest_format.save(flat, forest_path)
+
+    # the data only changes once the model trained on it is saved, so a failed fit leaves it as it was
+    start = time.perf_counter()
+    append_rows(rows, data)
+    append_seconds = time.perf_counter() - start
+    data_sha256 = dataset.file_sha256(data)
+
+    report = {
+        'model': name,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'update': {
+            'base': base, 'new_data': new_data, 'new_rows': int(len(y_new)),
+            'new_duplicates': int(duplicate.sum()), 'base_accuracy_on_new_rows': unseen_accuracy,
+            'trees_before': trees_before, 'trees_added': add_trees,
+            'append_seconds': append_seconds, 'fit_seconds': fit_seconds,
+        },
+        'data': {'path': data, 'sha256': data_sha256, 'rows': int(len(y)), 'duplicates_dropped': duplicates},
+        'size': {
+            'trees': flat.n_trees,
+            'nodes': int(len(flat.feature)),
+            'pkl_bytes': os.path.getsize(pkl_path),
+            'forest_bytes': os.path.getsize(forest_path),
+        },
+    }
+    with open(os.path.join(model_dir, f'{name}.json'), 'w') as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train a versioned CKD random forest from data/df.csv')
+    parser.add_argument('--data', default='data/df.csv')
+    parser.add_argument('--model-dir', default=model_registry.MODEL_DIR)
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='pick the smallest forest whose CV accuracy is within this of the best')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=-1, help='parallel search workers (-1: all cores)')
+    parser.add_argument('--update', metavar='NEW_CSV',
+                        help='append these labelled rows to --data and grow the latest model instead of retraining')
+    parser.add_argument('--base', help='model in --model-dir to grow with --update (default: latest ckd_rf_v*.pkl)')
+    parser.add_argument('--add-trees', type=int, default=10, help='trees fitted by --update')
+    args = parser.parse_args(argv)
+
+    if args.update:
+        report = update(args.update, args.data, args.model_dir, args.base, args.add_trees)
+        info = report['update']
+        print(f"{report['model']}: {info['base']} + {info['trees_added']} trees ({report['size']['trees']} total)")
+        print(f"  appended {info['new_rows']} rows to {args.data}, {info['new_duplicates']} of them duplicates")
+        if info['base_accuracy_on_new_rows'] is not None:
+            print(f"  {info['base']} accuracy on the new rows: {info['base_accuracy_on_new_rows']:.3f}")
+        print(f"  update took {info['append_seconds'] + info['fit_seconds']:.2f}s "
+              f"(append {info['append_seconds']:.2f}s, fit {info['fit_seconds']:.2f}s)")
+        return
+
+    report = train(args.data, args.model_dir, args.tolerance, args.folds, seed=args.seed, jobs=args.jobs)
+    test, size, latency = report['test'], report['size'], report['latency_ms_per_row']
+    print(f"{report['model']}: {report['chosen_params']}")
+    print(f"  CV accuracy (best): {report['search']['best_cv_accuracy']:.3f}, "
+          f"search took {report['search']['seconds']:.1f}s")
+    print(f"  test accuracy {test['accuracy']:.3f}, recall {test['recall']:.3f}, f1 {test['f1']:.3f}")
+    print(f"  {size['trees']} trees, {size['nodes']} nodes, {size['pkl_bytes'] / 1024:.0f} KB pickle, "
+          f"{size['forest_bytes'] / 1024:.0f} KB .forest")
+    print(f"  per-row latency: sklearn {latency['sklearn']:.2f} ms, flat {latency['flat']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()